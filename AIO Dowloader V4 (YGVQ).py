@@ -1,18 +1,55 @@
+import argparse
+import atexit
+import base64
+import calendar
+import collections
+import contextvars
+import errno
+import hashlib
+import http.client
+import io
+import json
+import math
+import ssl
+import struct
 import subprocess
 import os
+import queue
+import random
 import re
+import selectors
 import shutil
+import sqlite3
 import sys
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs, parse_qsl, urlencode, urljoin, urlsplit
 
 from colorama import init as colorama_init, Fore, Style
 from tqdm import tqdm
 
-# ——— Init ——————————————————————————————————————————————————————————————
-colorama_init(autoreset=True)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from mutagen import MutagenError
+    from mutagen.id3 import ID3, APIC, ID3NoHeaderError
+except ImportError:
+    ID3 = None
 
 # ——— Banner & Message Functions ———————————————————————————————————————
+# With --jobs, stdout carries JSON-lines results, so messages go to stderr.
+# LOG_HOOK(level, msg) replaces printing altogether (the aiod package routes
+# messages into `logging`).
+LOG_STREAM = sys.stdout
+LOG_HOOK = None
+
 def print_banner():
     banner = r"""
            _____ ____    _____  
@@ -22,17 +59,23 @@ def print_banner():
   / ____ \ _| || |__| | | |__| |
  /_/    \_\_____\____/  |_____/ 
     """
-    print(Fore.MAGENTA + banner)
-    print(Fore.MAGENTA + Style.BRIGHT + " Made by NotKevin, updated by YGVQ\n")
+    print(Fore.MAGENTA + banner, file=LOG_STREAM)
+    print(Fore.MAGENTA + Style.BRIGHT + " Made by NotKevin, updated by YGVQ\n", file=LOG_STREAM)
 
 def print_error(msg):
-    print(Fore.RED + "[ERROR] " + msg)
+    if LOG_HOOK:
+        return LOG_HOOK("error", msg)
+    print(Fore.RED + "[ERROR] " + msg, file=LOG_STREAM)
 
 def print_success(msg):
-    print(Fore.GREEN + "[SUCCESS] " + msg)
+    if LOG_HOOK:
+        return LOG_HOOK("success", msg)
+    print(Fore.GREEN + "[SUCCESS] " + msg, file=LOG_STREAM)
 
 def print_info(msg):
-    print(Fore.CYAN + "[INFO] " + msg)
+    if LOG_HOOK:
+        return LOG_HOOK("info", msg)
+    print(Fore.CYAN + "[INFO] " + msg, file=LOG_STREAM)
 
 # ——— Pre-req checks ————————————————————————————————————————————————————
 def ensure_available(cmd):
@@ -40,9 +83,6 @@ def ensure_available(cmd):
         print_error(f"'{cmd}' not found on PATH. Please install it first.")
         sys.exit(1)
 
-for tool in ("curl", "ffmpeg", "ffprobe"):
-    ensure_available(tool)
-
 # ——— Helpers ———————————————————————————————————————————————————————
 def expand_path(path):
     return os.path.abspath(os.path.expanduser(os.path.expandvars(path)))
@@ -69,201 +109,2834 @@ def sanitize_filename(name):
     return re.sub(r'[<>:"/\\|?*]+', "_", name)
 
 def unique_path(path):
-    if not os.path.exists(path):
-        return path
+    # Claims a free name by creating it empty with O_EXCL, so concurrent jobs
+    # (or another running copy of the script) can never pick the same file.
+    # The placeholder is meant to be replaced with os.replace.
     root, ext = os.path.splitext(path)
-    i = 1
+    candidate, i = path, 1
     while True:
-        candidate = f"{root}_{i}{ext}"
-        if not os.path.exists(candidate):
+        try:
+            os.close(os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
             return candidate
-        i += 1
+        except FileExistsError:
+            candidate = f"{root}_{i}{ext}"
+            i += 1
 
-def run_with_retries(cmd, attempts=3, backoff_base=1.5, cwd=None):
-    for i in range(attempts):
+# ——— Transport ————————————————————————————————————————————————————————
+class DownloadError(Exception):
+    pass
+
+class HttpStatusError(DownloadError):
+    def __init__(self, status, url, headers=None):
+        super().__init__(f"HTTP {status} for {url.split('?', 1)[0]}")
+        self.status = status
+        self.url = url
+        self.headers = headers or {}
+
+class StubResponseError(DownloadError):
+    pass
+
+class SegmentCancelled(DownloadError):
+    pass
+
+class CurlError(DownloadError):
+    def __init__(self, code, url):
+        super().__init__(f"curl exit code {code} for {url.split('?', 1)[0]}")
+        self.code = code
+
+class DownloadFailed(DownloadError):
+    # Raised by run_with_retries when it gives up. `kind` is "auth", "client",
+    # "fatal", "throttled", "circuit" or "exhausted".
+    def __init__(self, message, kind):
+        super().__init__(message)
+        self.kind = kind
+
+MIN_EPISODE_BYTES = 50_000
+
+def sniff_response(content_type, size):
+    # Header check for episode downloads, done before any body is written.
+    ctype = (content_type or "").split(";", 1)[0].strip().lower()
+    if ctype.startswith(("text/", "application/json", "application/xml", "application/xhtml")):
+        return f"server sent {ctype} instead of audio"
+    if size is not None and size < MIN_EPISODE_BYTES:
+        return f"response is only {size} bytes"
+    return None
+
+def sniff_media_head(head):
+    # Magic-byte check on the first chunk: ID3 / MPEG frame sync, an MP4
+    # `ftyp` box and a few other audio containers pass; markup or JSON fails.
+    # Anything unrecognised is left for ffprobe to judge after the download.
+    if head[:3] == b"ID3" or head[4:8] == b"ftyp" or head[:4] in (b"OggS", b"fLaC", b"RIFF"):
+        return None
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return None
+    if head[:512].lstrip().startswith((b"<", b"{")):
+        return "server sent an HTML/XML/JSON page instead of audio"
+    return None
+
+def split_header(h):
+    name, _, value = h.partition(":")
+    return name.strip(), value.strip()
+
+# Query parameters that sign or time-limit a link (CloudFront, S3, GCS,
+# Akamai, plain tokens) rather than pick the file; they change every paste.
+SIGNATURE_PARAMS = {"expires", "exp", "expiry", "expiration", "signature", "sig",
+                    "key-pair-id", "policy", "token", "hdnts", "hdnea", "hmac", "__gda__"}
+SIGNATURE_PREFIXES = ("x-amz-", "x-goog-")
+
+def is_signature_param(name):
+    name = name.lower()
+    return name in SIGNATURE_PARAMS or name.startswith(SIGNATURE_PREFIXES)
+
+def url_key(url):
+    # Signed links differ only in their signing parameters between pastes, so
+    # the scheme, host, path and the rest of the query (sorted) identify the
+    # episode.
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not is_signature_param(k))
+    key = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}"
+    return f"{key}?{urlencode(query)}" if query else key
+
+def origin(url):
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    return scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80)
+
+def same_origin(a, b):
+    return origin(a) == origin(b)
+
+def strip_credentials(hdrs):
+    return [h for h in hdrs if split_header(h)[0].lower() not in ("cookie", "authorization")]
+
+def response_validators(resp):
+    pairs = (("etag", resp.getheader("ETag")), ("last_modified", resp.getheader("Last-Modified")))
+    return {k: v for k, v in pairs if v}
+
+def validators_match(saved, current):
+    return all(current.get(k) == v for k, v in saved.items())
+
+def load_part_state(part, url):
+    try:
+        with open(part + ".json", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url_key(url) or not os.path.exists(part):
+        return None
+    return state
+
+def save_part_state(part, state):
+    tmp = part + ".json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, part + ".json")
+
+def preallocate(f, size):
+    # Reserves the file's blocks up front where the OS supports it: fewer
+    # fragments, and a full disk fails now instead of halfway. Elsewhere the
+    # file is only extended (sparse).
+    if hasattr(os, "posix_fallocate"):
         try:
-            subprocess.run(cmd, cwd=cwd, check=True)
-            return True
-        except subprocess.CalledProcessError:
-            if i < attempts - 1:
-                time.sleep(backoff_base ** i)
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+    f.truncate(size)
+
+def discard_part_state(part):
+    try:
+        os.remove(part + ".json")
+    except OSError:
+        pass
+
+class CurlTransport:
+    name = "curl"
+
+    def download(self, url, dest, hdrs, cookie=None, show_progress=False, segments=1,
+                 resume=False, sniff=False):
+        part = dest + ".part" if resume else dest
+        row = _row_var.get() if DASHBOARD else None
+        cmd = ["curl", "-L", "-f", url]
+        if not row:
+            # With the dashboard curl keeps its default meter on stderr, which
+            # parse_curl_progress reads.
+            cmd.insert(1, "-#" if show_progress else "-s")
+        for h in hdrs:
+            # curl sets its own Range header when continuing a partial file.
+            if resume and h.lower().startswith("range:"):
+                continue
+            cmd += ["-H", h]
+        if cookie:
+            cmd += ["-b", cookie]
+        if resume:
+            cmd += ["-C", "-"]
+        cmd += ["-w", "%{http_code}", "-o", part]
+        if row:
+            row.transfer()
+            returncode, out = self._run_watched(cmd, row)
+        else:
+            res = run_child(cmd, stdout=subprocess.PIPE)
+            returncode, out = res.returncode, res.stdout
+        if returncode:
+            status = out.decode(errors="replace").strip()
+            # Exit code 22 is curl -f's "HTTP status >= 400".
+            if returncode == 22 and status.isdigit():
+                raise HttpStatusError(int(status), url)
+            raise CurlError(returncode, url)
+        if resume:
+            os.replace(part, dest)
+
+    def read(self, url, hdrs, cookie=None, limit=None):
+        # Returns the whole body as bytes, for small files such as covers.
+        # The status code goes to stderr so stdout carries only the body.
+        cmd = ["curl", "-L", "-f", "-s", "-w", "%{stderr}%{http_code}"]
+        for h in hdrs:
+            if not h.lower().startswith("range:"):
+                cmd += ["-H", h]
+        if cookie:
+            cmd += ["-b", cookie]
+        if limit:
+            cmd += ["--max-filesize", str(limit)]
+        res = run_child(cmd + [url], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if res.returncode == 63:
+            raise StubResponseError(f"response is larger than {format_amount(limit, 'B')}")
+        if res.returncode:
+            status = res.stderr.decode(errors="replace").strip()
+            if res.returncode == 22 and status.isdigit():
+                raise HttpStatusError(int(status), url)
+            raise CurlError(res.returncode, url)
+        return res.stdout
+
+    def _run_watched(self, cmd, row):
+        with popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as p:
+            done = DASHBOARD.watch(p.stderr, parse_curl_progress, row)
+            out = p.stdout.read()
+            done.wait()
+            p.wait()
+        charge_child(p)
+        return p.returncode, out
+
+    def close(self):
+        pass
+
+class HttpTransport:
+    # Pure-Python backend. Connections are pooled per (scheme, host, port) and
+    # handed back after each fully-read response, so consecutive episodes and
+    # cover fetches in a session reuse one TCP+TLS handshake.
+    name = "http"
+    chunk_size = 256 * 1024
+
+    def __init__(self, timeout=30, max_idle_per_host=8, ssl_context=None, max_redirects=10):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.max_redirects = max_redirects
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self.ssl_context
+            )
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, conn, method, target, hdrs):
+        names = {split_header(h)[0].lower() for h in hdrs}
+        conn.putrequest(method, target, skip_host="host" in names,
+                        skip_accept_encoding=True)
+        for h in hdrs:
+            name, value = split_header(h)
+            # Bodies are written to disk as-is, so never ask for compression.
+            if name.lower() == "accept-encoding":
+                continue
+            conn.putheader(name, value)
+        conn.endheaders()
+        return conn.getresponse()
+
+    def open(self, url, hdrs, cookie=None, method="GET"):
+        # Returns (key, conn, response) for a 2xx response after following
+        # redirects. The caller must finish with `finish(key, conn, resp)`.
+        hdrs = list(hdrs)
+        if cookie:
+            hdrs.append(f"Cookie: {cookie}")
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            key = origin(url)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+            conn, reused = self._acquire(key)
+            try:
+                resp = self._send(conn, method, target, hdrs)
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server dropped an idle keep-alive; retry once fresh.
+                conn = self._connect(key)
+                try:
+                    resp = self._send(conn, method, target, hdrs)
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    raise
+
+            set_cookies = resp.msg.get_all("Set-Cookie")
+            if set_cookies and get_sessions():
+                try:
+                    get_sessions().absorb(url, set_cookies)
+                except OSError as e:
+                    print_error(f"Could not update saved sessions: {e}")
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+                location = urljoin(url, resp.getheader("Location"))
+                self.finish(key, conn, resp, drain=True)
+                if not same_origin(url, location):
+                    # Like curl, never hand credentials to another host.
+                    hdrs = strip_credentials(hdrs)
+                url = location
+                continue
+            if resp.status >= 400:
+                err = HttpStatusError(resp.status, url, dict(resp.getheaders()))
+                self.finish(key, conn, resp, drain=True)
+                raise err
+            resp.url = url
+            return key, conn, resp
+        raise DownloadError(f"Too many redirects for {url.split('?', 1)[0]}")
+
+    def finish(self, key, conn, resp, drain=False):
+        try:
+            if drain and not resp.isclosed():
+                resp.read(1024 * 1024)
+            if resp.isclosed() and not resp.will_close:
+                self._release(key, conn)
+                return
+        except (http.client.HTTPException, OSError):
+            pass
+        conn.close()
+
+    def _copy_body(self, resp, f, expected, on_chunk, check_head=None):
+        written = 0
+        while True:
+            chunk = resp.read(self.chunk_size)
+            if not chunk:
+                break
+            if check_head and written == 0:
+                check_head(chunk)
+            f.write(chunk)
+            written += len(chunk)
+            on_chunk(len(chunk))
+        if expected is not None and written < expected:
+            raise DownloadError(f"Connection closed after {written} of {expected} bytes")
+        return written
+
+    def read(self, url, hdrs, cookie=None, limit=None):
+        # Returns the whole body as bytes, for small files such as covers.
+        hdrs = [h for h in hdrs if not h.lower().startswith("range:")]
+        key, conn, resp = self.open(url, hdrs, cookie=cookie)
+        length = resp.getheader("Content-Length") or ""
+        expected = int(length) if length.isdigit() else None
+        buf = io.BytesIO()
+
+        def check_size(size):
+            if limit and size > limit:
+                raise StubResponseError(f"response is larger than {format_amount(limit, 'B')}")
+
+        try:
+            check_size(expected or 0)
+            self._copy_body(resp, buf, expected, lambda n: check_size(buf.tell()))
+        except BaseException:
+            conn.close()
+            raise
+        self.finish(key, conn, resp)
+        return buf.getvalue()
+
+    def probe(self, url, hdrs, cookie=None):
+        # One-byte ranged GET. Returns (final_url, total_size, validators);
+        # the size is None when the server doesn't honour byte ranges.
+        key, conn, resp = self.open(url, list(hdrs) + ["Range: bytes=0-0"], cookie=cookie)
+        content_range = resp.getheader("Content-Range") or ""
+        validators = response_validators(resp)
+        content_type = resp.getheader("Content-Type")
+        self.finish(key, conn, resp, drain=True)
+        m = re.match(r"bytes\s+0-0/(\d+)", content_range)
+        total = int(m.group(1)) if resp.status == 206 and m else None
+        return resp.url, total, validators, content_type
+
+    def download(self, url, dest, hdrs, cookie=None, show_progress=False, segments=1,
+                 resume=False, sniff=False, min_segment_size=2 * 1024 * 1024):
+        # The body is fetched as one or more byte ranges, each written in place
+        # into a preallocated file on its own pooled connection. With `resume`
+        # the data goes to `dest.part` and progress to a JSON sidecar, so a
+        # retry or a later run continues from the last byte written as long as
+        # the remote ETag/Last-Modified and size are unchanged. With `sniff`
+        # the response headers and first bytes must look like audio, or the
+        # transfer is cancelled with StubResponseError.
+        hdrs = [h for h in hdrs if not h.lower().startswith("range:")]
+        part = dest + ".part" if resume else dest
+        state = load_part_state(part, url) if resume else None
+        # The sidecar is keyed on the URL that was asked for; ranges go to
+        # wherever it redirects.
+        fetch_url, total, validators = url, None, {}
+        if state or segments > 1:
+            fetch_url, total, validators, content_type = self.probe(url, hdrs, cookie=cookie)
+            if not same_origin(url, fetch_url):
+                # The ranges go straight to the other host, so they must not
+                # carry the credentials open() dropped on the way there.
+                hdrs, cookie = strip_credentials(hdrs), None
+            reason = sniff and sniff_response(content_type, total)
+            if reason:
+                raise StubResponseError(reason)
+        if state and (total != state["size"] or not validators_match(state["validators"], validators)):
+            print_info("Remote file changed since the last attempt; starting over.")
+            state = None
+        resumed = state is not None
+
+        if state is None:
+            if total and segments > 1 and total >= 2 * min_segment_size:
+                step = -(-total // min(segments, total // min_segment_size))
+                plan = [[start, min(start + step, total) - 1, 0] for start in range(0, total, step)]
             else:
-                return False
+                plan = [[0, total - 1 if total else None, 0]]
+            state = {"url": url_key(url), "size": total, "validators": validators, "segments": plan}
+            with open(part, "wb") as f:
+                if total:
+                    preallocate(f, total)
+        else:
+            done = sum(seg[2] for seg in state["segments"])
+            print_info(f"Resuming {os.path.basename(dest)} from {done // 1024} KiB.")
 
-def download_with_headers(url, dest, hdrs, cookie=None):
-    cmd = ["curl", "-s", "-L", "-f", url]
-    for h in hdrs:
-        cmd += ["-H", h]
-    if cookie:
-        cmd += ["-b", cookie]
-    cmd += ["-o", dest]
-    return run_with_retries(cmd, attempts=3)
+        initial = sum(seg[2] for seg in state["segments"])
+        bar = tqdm(total=state["size"], initial=initial,
+                   unit="B", unit_scale=True, ncols=80, leave=True, disable=not show_progress)
+        row = _row_var.get()
+        if row:
+            row.transfer(state["size"], initial)
+        lock = threading.Lock()
+        last_save = [time.monotonic()]
+        cancelled = threading.Event()
+        restart = threading.Event()
 
-def get_media_duration(path):
-    res = subprocess.run(
-        ["ffprobe", "-v", "error",
-         "-show_entries", "format=duration",
-         "-of", "csv=p=0", path],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        check=True
+        def check_head(chunk):
+            reason = sniff_media_head(chunk)
+            if reason:
+                raise StubResponseError(reason)
+
+        def on_chunk(seg, n):
+            if cancelled.is_set():
+                raise SegmentCancelled("Cancelled")
+            with lock:
+                seg[2] += n
+                bar.update(n)
+                if row:
+                    row.advance(n)
+                if resume and time.monotonic() - last_save[0] > 1.0:
+                    save_part_state(part, state)
+                    last_save[0] = time.monotonic()
+
+        def fetch(seg):
+            start, end = seg[0] + seg[2], seg[1]
+            if end is not None and start > end:
+                return
+            range_hdrs = hdrs + [f"Range: bytes={start}-{'' if end is None else end}"]
+            if resumed and start > 0:
+                # Only saved bytes need protecting, and a weak ETag can't be
+                # used with If-Range (the server would always send 200).
+                v = state["validators"]
+                etag = v.get("etag")
+                validator = etag if etag and not etag.startswith("W/") else v.get("last_modified")
+                if validator:
+                    range_hdrs.append(f"If-Range: {validator}")
+            key, conn, resp = self.open(fetch_url, range_hdrs, cookie=cookie)
+            try:
+                content_range = resp.getheader("Content-Range") or ""
+                if sniff and start == 0:
+                    m = re.search(r"/(\d+)$", content_range)
+                    length = resp.getheader("Content-Length") or ""
+                    size = int(m.group(1)) if m else (int(length) if length.isdigit() else None)
+                    reason = sniff_response(resp.getheader("Content-Type"), size)
+                    if reason:
+                        raise StubResponseError(reason)
+                if resp.status == 206 and not content_range.startswith(f"bytes {start}-"):
+                    raise DownloadError(f"Server returned the wrong range for bytes {start}-")
+                if resp.status != 206 and (start > 0 or len(state["segments"]) > 1):
+                    # A full body instead of the range means the object changed
+                    # (If-Range failed) or ranges aren't supported any more.
+                    restart.set()
+                    raise DownloadError("Server ignored the byte range; restarting from zero.")
+                if state["size"] is None:
+                    m = re.search(r"/(\d+)$", content_range)
+                    length = resp.getheader("Content-Length") or ""
+                    state["size"] = int(m.group(1)) if m else (int(length) if length.isdigit() else None)
+                    state["validators"] = response_validators(resp)
+                    if state["size"]:
+                        seg[1] = state["size"] - 1
+                        bar.total = state["size"]
+                        bar.refresh()
+                        if row:
+                            row.total = state["size"]
+                expected = seg[1] - start + 1 if seg[1] is not None else None
+                with open(part, "r+b", buffering=0) as f:
+                    f.seek(start)
+                    self._copy_body(resp, f, expected, lambda n: on_chunk(seg, n),
+                                    check_head=check_head if sniff and start == 0 else None)
+            except BaseException:
+                cancelled.set()
+                conn.close()
+                raise
+            self.finish(key, conn, resp)
+
+        try:
+            if len(state["segments"]) == 1:
+                fetch(state["segments"][0])
+            else:
+                with ThreadPoolExecutor(max_workers=len(state["segments"])) as pool:
+                    futures = [pool.submit(fetch, seg) for seg in state["segments"]]
+                    errors = [fut.exception() for fut in futures if fut.exception()]
+                if errors:
+                    # Report the segment that failed, not the ones it cancelled.
+                    raise next((e for e in errors if not isinstance(e, SegmentCancelled)), errors[0])
+        except StubResponseError:
+            remove_temp_files([part])
+            discard_part_state(part)
+            raise
+        except BaseException:
+            if restart.is_set():
+                remove_temp_files([part])
+                discard_part_state(part)
+            elif resume and os.path.exists(part):
+                with lock:
+                    save_part_state(part, state)
+            raise
+        finally:
+            bar.close()
+
+        if resume:
+            os.replace(part, dest)
+            discard_part_state(part)
+
+    def close(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for c in conns:
+            c.close()
+
+def make_transport(name):
+    return CurlTransport() if name == "curl" else HttpTransport()
+
+TRANSPORT = make_transport(os.environ.get("AIOD_TRANSPORT", "http"))
+
+def set_transport(transport):
+    global TRANSPORT
+    if TRANSPORT is not transport:
+        TRANSPORT.close()
+    TRANSPORT = transport
+
+def download_with_headers(url, dest, hdrs, cookie=None, show_progress=False, segments=1,
+                          resume=False, sniff=False):
+    # Raises StubResponseError when `sniff` rejects the body and
+    # DownloadFailed when the retry policy gives up.
+    return run_with_retries(
+        lambda: TRANSPORT.download(url, dest, hdrs, cookie=cookie, show_progress=show_progress,
+                                   segments=segments, resume=resume, sniff=sniff),
+        attempts=RETRY_ATTEMPTS,
+        host=urlsplit(url).netloc.lower(),
+        cred=credential_key(hdrs, cookie, url)
     )
-    val = res.stdout.decode().strip()
+
+def fetch_bytes(url, hdrs, cookie=None, limit=None):
+    # In-memory download_with_headers for small files. Returns the body;
+    # raises StubResponseError past `limit` bytes and DownloadFailed when the
+    # retry policy gives up.
+    body = []
+    run_with_retries(
+        lambda: body.append(TRANSPORT.read(url, hdrs, cookie=cookie, limit=limit)),
+        attempts=RETRY_ATTEMPTS,
+        host=urlsplit(url).netloc.lower(),
+        cred=credential_key(hdrs, cookie, url)
+    )
+    return body[-1]
+
+# ——— Retry Policy ——————————————————————————————————————————————————————
+# Failures are classified before anything is retried. Auth failures
+# (401/403/407) and other 4xx answers fail at once; 408/425/429/5xx, dropped
+# connections and timeouts are retried with full-jitter exponential backoff,
+# or after the server's Retry-After. A per-host circuit breaker stops a batch
+# from queueing retries against a host that keeps failing, and once a host
+# rejects a cookie/Authorization header, other jobs using the same
+# credentials fail immediately instead of each burning their retries.
+RETRY_ATTEMPTS = 4
+RETRY_BASE = 1.0
+RETRY_CAP = 30.0
+RETRY_AFTER_MAX = 120.0
+AUTH_STATUS = {401, 403, 407}
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# curl exit codes for transient trouble: proxy/DNS/connect failures, HTTP/2
+# framing, partial transfers, timeouts, TLS handshakes, empty or broken
+# replies.
+RETRYABLE_CURL = {5, 6, 7, 16, 18, 28, 35, 52, 55, 56, 92}
+FATAL_ERRNOS = {errno.ENOSPC, errno.EACCES, errno.EROFS}
+
+def header_value(headers, name):
+    return next((v for k, v in (headers or {}).items() if k.lower() == name.lower()), None)
+
+def parse_retry_after(value):
+    # Seconds to wait, from either delta-seconds or an HTTP date.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
     try:
-        return float(val)
-    except ValueError:
-        res2 = subprocess.run(
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+def classify_failure(exc):
+    # Returns (kind, wait) with kind "retry", "auth", "client" or "fatal" and
+    # wait the server-requested delay in seconds (or None).
+    if isinstance(exc, HttpStatusError):
+        if exc.status in AUTH_STATUS:
+            return "auth", None
+        if exc.status in RETRYABLE_STATUS or exc.status >= 500:
+            return "retry", parse_retry_after(header_value(exc.headers, "Retry-After"))
+        return "client", None
+    if isinstance(exc, CurlError):
+        return ("retry" if exc.code in RETRYABLE_CURL else "fatal"), None
+    if isinstance(exc, ssl.SSLCertVerificationError):
+        return "fatal", None
+    if isinstance(exc, OSError) and exc.errno in FATAL_ERRNOS:
+        return "fatal", None
+    return "retry", None
+
+def credential_key(hdrs, cookie=None, url=None):
+    # A signed link is a credential of its own: one expired signature must
+    # not get other links sent with the same cookie denied.
+    secrets = [cookie or ""] + [
+        value for name, value in map(split_header, hdrs)
+        if name.lower() in ("cookie", "authorization")
+    ]
+    if url:
+        secrets += sorted(f"{k}={v}" for k, v in parse_qsl(urlsplit(url).query, keep_blank_values=True)
+                          if is_signature_param(k))
+    return hashlib.sha256("\n".join(secrets).encode()).hexdigest()[:16] if any(secrets) else ""
+
+class CircuitBreaker:
+    # `threshold` consecutive retryable failures, from at least that many
+    # different jobs, open a host for `cooldown` seconds. Requests for the
+    # host wait that out (for at most `max_wait` seconds each); then one
+    # goes ahead as a trial that closes the host again on success or
+    # re-opens it on failure. Rejected credentials stay rejected for the
+    # session (a fresh cURL brings new ones).
+    def __init__(self, threshold=5, cooldown=60.0, max_wait=300.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._hosts = {}
+        self._denied = {}
+        self._lock = threading.Lock()
+
+    def delay(self, host, cred="", waited=0.0):
+        # Seconds to wait before the next request to `host`, 0 to go ahead.
+        # Raises DownloadFailed for rejected credentials, or when waiting
+        # would take the caller past max_wait.
+        with self._lock:
+            if cred and (host, cred) in self._denied:
+                raise DownloadFailed(self._denied[(host, cred)], "auth")
+            h = self._hosts.get(host)
+            if not h or not h["open_until"]:
+                return 0.0
+            now = time.monotonic()
+            wait = h["open_until"] - now
+            if wait <= 0:
+                # A trial that never reported back (cancelled, not retryable)
+                # expires after one cooldown.
+                if now - h["trial"] > self.cooldown:
+                    h["trial"] = now
+                    return 0.0
+                wait = 1.0
+            if waited + wait > self.max_wait:
+                raise DownloadFailed(
+                    f"{host} failed {h['failures']} times in a row; gave up waiting after {waited:.0f}s",
+                    "circuit"
+                )
+            return wait
+
+    def check(self, host, cred=""):
+        waited = 0.0
+        while True:
+            wait = self.delay(host, cred, waited)
+            if not wait:
+                return
+            with self._lock:
+                h = self._hosts.get(host)
+                announce = h is not None and not h["announced"]
+                if announce:
+                    h["announced"] = True
+            if announce:
+                print_info(f"{host} keeps failing; pausing it for {wait:.0f}s.")
+            time.sleep(wait)
+            waited += wait
+
+    def success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def failure(self, host, cred, kind, message, job=None):
+        # `job` identifies the caller, so one job's retries count only once.
+        with self._lock:
+            if kind == "auth" and cred:
+                self._denied[(host, cred)] = f"same credentials were rejected earlier ({message})"
+            elif kind == "retry":
+                h = self._hosts.setdefault(host, {"failures": 0, "jobs": set(), "open_until": 0.0, "trial": 0.0,
+                                                   "announced": False})
+                if job is None or job not in h["jobs"]:
+                    h["failures"] += 1
+                    h["jobs"].add(job)
+                if h["open_until"] or h["failures"] >= self.threshold:
+                    h["open_until"] = time.monotonic() + self.cooldown
+                    h["trial"] = 0.0
+                    h["announced"] = False
+
+BREAKER = CircuitBreaker()
+
+RETRYABLE_ERRORS = (subprocess.CalledProcessError, DownloadError, http.client.HTTPException, OSError)
+
+def retry_wait(e, attempt, attempts, host=None, cred="", job=None):
+    # Classifies failed attempt number `attempt` (from 0) and returns the
+    # seconds to wait before the next one, or raises DownloadFailed. `job` is
+    # any object identifying the caller to the circuit breaker.
+    kind, wait = classify_failure(e)
+    if host:
+        BREAKER.failure(host, cred, kind, str(e), job)
+    if kind != "retry":
+        raise DownloadFailed(str(e), kind) from e
+    if attempt >= attempts - 1:
+        raise DownloadFailed(f"{e} (gave up after {attempts} attempts)", "exhausted") from e
+    if wait is None:
+        return random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt))
+    if wait > RETRY_AFTER_MAX:
+        raise DownloadFailed(f"{e}; server asked to wait {wait:.0f}s", "throttled") from e
+    return wait
+
+def run_with_retries(attempt, attempts=3, host=None, cred=""):
+    # `attempt` is a callable doing one attempt. Returns True or raises
+    # DownloadFailed; StubResponseError passes through because retrying can't
+    # turn an error page into audio.
+    job = object()
+    for i in range(attempts):
+        if host:
+            BREAKER.check(host, cred)
+        try:
+            attempt()
+        except StubResponseError:
+            raise
+        except RETRYABLE_ERRORS as e:
+            time.sleep(retry_wait(e, i, attempts, host, cred, job))
+        else:
+            if host:
+                BREAKER.success(host)
+            return True
+
+# ——— Stage Metrics —————————————————————————————————————————————————————
+# With --timings, --trace or --prom each pipeline stage of each episode
+# (download, cover, probe, convert, stream, embed, record) reports wall time,
+# CPU time and the episode bytes it handled. CPU time is the Python thread's
+# plus that of the ffmpeg/ffprobe/curl children the stage waited for, taken
+# from wait4() (POSIX; on Windows only the Python side is counted). Stages
+# nest, and an outer stage includes its inner ones. When disabled, stage()
+# hands back one shared no-op object and children run through plain
+# subprocess calls.
+METRICS = None
+PROM_INTERVAL = 5.0
+_stage_var = contextvars.ContextVar("aiod_stage", default=None)
+_episode_var = contextvars.ContextVar("aiod_episode", default=None)
+_charge_lock = threading.Lock()
+
+class Stage:
+    def __init__(self, name, episode):
+        self.name = name
+        self.episode = episode
+        self.bytes = None
+        self.ok = True
+        self.child_cpu = 0.0
+        self.parent = None
+
+    def __enter__(self):
+        self.parent = _stage_var.get()
+        self._token = _stage_var.set(self)
+        self._start = time.time()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall0
+        cpu = time.thread_time() - self._cpu0 + self.child_cpu
+        _stage_var.reset(self._token)
+        METRICS.add({
+            "ts": round(self._start, 3),
+            "episode": self.episode,
+            "stage": self.name,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "bytes": self.bytes,
+            "mb_per_s": round(self.bytes / wall / 1e6, 3) if self.bytes and wall > 0 else None,
+            "ok": self.ok and exc_type is None,
+        })
+        return False
+
+    def charge(self, secs):
+        with _charge_lock:
+            st = self
+            while st is not None:
+                st.child_cpu += secs
+                st = st.parent
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, episode=None):
+    # `with stage("convert") as st:` times the block; set st.bytes / st.ok.
+    # The name also labels the job's dashboard row.
+    row = _row_var.get()
+    if row is not None:
+        row.begin(name)
+    if METRICS is None:
+        return _NULL_STAGE
+    return Stage(name, episode or _episode_var.get())
+
+def set_episode(name):
+    # Episode label for stages started later in this thread (or task).
+    _episode_var.set(name)
+
+class _MeteredPopen(subprocess.Popen):
+    # Reaps the child with wait4() so its rusage is kept for the stage.
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, sts
+
+def popen(cmd, **kwargs):
+    if _stage_var.get() is None or not hasattr(os, "wait4"):
+        return subprocess.Popen(cmd, **kwargs)
+    return _MeteredPopen(cmd, **kwargs)
+
+def charge_child(p):
+    st, rusage = _stage_var.get(), getattr(p, "rusage", None)
+    if st is not None and rusage is not None:
+        st.charge(rusage.ru_utime + rusage.ru_stime)
+
+def run_child(cmd, check=False, input=None, **kwargs):
+    # subprocess.run that charges the child's CPU time to the current stage.
+    if _stage_var.get() is None:
+        return subprocess.run(cmd, check=check, input=input, **kwargs)
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    with popen(cmd, **kwargs) as p:
+        try:
+            out, err = p.communicate(input)
+        except BaseException:
+            p.kill()
+            raise
+    charge_child(p)
+    if check and p.returncode:
+        raise subprocess.CalledProcessError(p.returncode, cmd, out, err)
+    return subprocess.CompletedProcess(cmd, p.returncode, out, err)
+
+def percentile(values, q):
+    # Nearest-rank percentile of a sorted list.
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+class Metrics:
+    # Collects stage records, appends them to the JSON-lines trace as they
+    # finish and rewrites the Prometheus textfile at most every PROM_INTERVAL
+    # seconds (and on close).
+    def __init__(self, trace_path=None, prom_path=None):
+        self.prom_path = prom_path
+        self._trace = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._prom_written = 0.0
+
+    def add(self, record):
+        with self._lock:
+            self._stages.setdefault(record["stage"], []).append(record)
+            if self._trace:
+                self._trace.write(json.dumps(record) + "\n")
+            if self.prom_path and time.monotonic() - self._prom_written >= PROM_INTERVAL:
+                self._write_prom()
+
+    def summary(self):
+        # {stage: {"count", "p50", "p95", "wall", "cpu", "bytes", "mb_per_s"}}
+        with self._lock:
+            return self._rows()
+
+    def _rows(self):
+        rows = {}
+        for name, records in self._stages.items():
+            walls = sorted(r["wall_s"] for r in records)
+            sized = [r for r in records if r["bytes"]]
+            sized_wall = sum(r["wall_s"] for r in sized)
+            rows[name] = {
+                "count": len(records),
+                "p50": percentile(walls, 0.50),
+                "p95": percentile(walls, 0.95),
+                "wall": sum(walls),
+                "cpu": sum(r["cpu_s"] for r in records),
+                "bytes": sum(r["bytes"] for r in sized),
+                "mb_per_s": sum(r["bytes"] for r in sized) / sized_wall / 1e6 if sized_wall else None,
+            }
+        return rows
+
+    def _write_prom(self):
+        rows = self._rows()
+        lines = [
+            "# HELP aiod_stage_seconds Wall time of one pipeline stage for one episode.",
+            "# TYPE aiod_stage_seconds summary",
+        ]
+        for name, row in rows.items():
+            lines += [
+                f'aiod_stage_seconds{{stage="{name}",quantile="0.5"}} {row["p50"]}',
+                f'aiod_stage_seconds{{stage="{name}",quantile="0.95"}} {row["p95"]}',
+                f'aiod_stage_seconds_sum{{stage="{name}"}} {row["wall"]:.4f}',
+                f'aiod_stage_seconds_count{{stage="{name}"}} {row["count"]}',
+            ]
+        lines += ["# HELP aiod_stage_cpu_seconds_total CPU time of the stage, including child processes.",
+                  "# TYPE aiod_stage_cpu_seconds_total counter"]
+        lines += [f'aiod_stage_cpu_seconds_total{{stage="{name}"}} {row["cpu"]:.4f}'
+                  for name, row in rows.items()]
+        lines += ["# HELP aiod_stage_bytes_total Episode bytes handled by the stage.",
+                  "# TYPE aiod_stage_bytes_total counter"]
+        lines += [f'aiod_stage_bytes_total{{stage="{name}"}} {row["bytes"]}'
+                  for name, row in rows.items()]
+        tmp = self.prom_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.prom_path)
+        except OSError as e:
+            print_error(f"Could not write metrics file: {e}")
+        self._prom_written = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.prom_path:
+                self._write_prom()
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+        print_metrics_summary(self.summary())
+
+def print_metrics_summary(rows):
+    if not rows:
+        return
+    print(file=LOG_STREAM)
+    print_info("Stage timings (wall p50 / p95 per episode, total CPU, throughput):")
+    for name, row in rows.items():
+        rate = f"{row['mb_per_s']:7.1f} MB/s" if row["mb_per_s"] is not None else ""
+        print(Fore.CYAN + f"  {name:<9}{row['count']:>4}x  p50 {row['p50']:7.2f}s  "
+                          f"p95 {row['p95']:7.2f}s  cpu {row['cpu']:8.2f}s  {rate}", file=LOG_STREAM)
+
+def enable_metrics(trace_path=None, prom_path=None):
+    global METRICS
+    METRICS = Metrics(trace_path, prom_path)
+    atexit.register(METRICS.close)
+    return METRICS
+
+# ——— Progress Dashboard ————————————————————————————————————————————————
+# Batch and --jobs runs on a terminal show one row per running job in a
+# dashboard redrawn DASHBOARD_HZ times a second, with the total download
+# rate and an ETA underneath. Child progress (ffmpeg's -progress output,
+# curl's progress meter) is read by a single reader thread through a
+# selector and only updates row fields; only the render thread writes to the
+# terminal, and messages printed meanwhile scroll above the dashboard.
+# Windows can't select() on pipes, so there each pipe gets a reader thread.
+DASHBOARD_ENABLED = False
+DASHBOARD_HZ = 4
+RATE_WINDOW = 5.0
+DASHBOARD = None
+_row_var = contextvars.ContextVar("aiod_row", default=None)
+_LOG_COLORS = {"error": (Fore.RED, "[ERROR] "), "success": (Fore.GREEN, "[SUCCESS] "),
+               "info": (Fore.CYAN, "[INFO] ")}
+_SIZE_UNITS = {"": 1, "k": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+CURL_METER_RE = re.compile(r"^\s*(\d+)\s+([\d.]+)([kMGT]?)\s+(\d+)\s+([\d.]+)([kMGT]?)\s")
+
+class ProgressRow:
+    def __init__(self, name):
+        self.name = name
+        self.stage = "queued"
+        self.unit = "B"          # "B" for transfers, "s" for ffmpeg media time
+        self.done = 0.0
+        self.total = None
+        self.received = 0        # all bytes downloaded for this job
+        self.ok = None           # set when the job finishes
+        self.stage_started = time.monotonic()
+
+    def begin(self, stage):
+        self.stage, self.unit, self.done, self.total = stage, "B", 0.0, None
+        self.stage_started = time.monotonic()
+
+    def transfer(self, total=None, done=0.0, unit="B"):
+        self.total, self.done, self.unit = total, done, unit
+
+    def advance(self, n):
+        self.done += n
+        self.received += n
+
+def parse_ffmpeg_progress(row, line):
+    if line.startswith("out_time_ms="):
+        value = line.split("=", 1)[1]
+        if value.isdigit():
+            row.done = int(value) / 1_000_000
+    elif line == "progress=end" and row.total:
+        row.done = row.total
+
+def parse_curl_progress(row, line):
+    # "  45 10.0M   45 4608k    0     0  4599k      0  0:00:02 ..."
+    m = CURL_METER_RE.match(line)
+    if not m:
+        return
+    total = float(m.group(2)) * _SIZE_UNITS[m.group(3)]
+    received = float(m.group(5)) * _SIZE_UNITS[m.group(6)]
+    if total:
+        row.total = total
+    row.received += max(0.0, received - row.done)
+    row.done = received
+
+def format_amount(value, unit):
+    if unit == "s":
+        value = int(value)
+        return f"{value // 3600}:{value // 60 % 60:02d}:{value % 60:02d}" if value >= 3600 \
+            else f"{value // 60}:{value % 60:02d}"
+    return f"{value / 1e6:.1f} MB"
+
+class ProgressHub:
+    def __init__(self, stream, total_jobs=0, hz=None):
+        self.stream = stream
+        self.total_jobs = total_jobs
+        self.interval = 1.0 / max(1, hz or DASHBOARD_HZ)
+        self.rows = {}
+        self.messages = []
+        self.finished = {True: 0, False: 0}
+        self.lock = threading.Lock()
+        self.samples = collections.deque()
+        self.started = time.monotonic()
+        self.drawn = 0
+        self._stop = threading.Event()
+        self._pending = []
+        self._threads = []
+        self._selector = None
+        if os.name != "nt":
+            self._selector = selectors.DefaultSelector()
+            self._wake_r, self._wake_w = os.pipe()
+            self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    # Rows
+    def row(self, key, name):
+        with self.lock:
+            if key not in self.rows:
+                self.rows[key] = ProgressRow(name)
+            return self.rows[key]
+
+    def finish(self, key, ok):
+        with self.lock:
+            row = self.rows.get(key)
+            if row and row.ok is None:
+                row.ok = ok
+                self.finished[bool(ok)] += 1
+
+    def log(self, level, msg):
+        color, prefix = _LOG_COLORS[level]
+        with self.lock:
+            self.messages.append(color + prefix + msg.strip("\n") + Style.RESET_ALL)
+
+    # Child pipes
+    def watch(self, pipe, parse, row):
+        # Feeds each line (split on \r or \n) of the binary `pipe` to
+        # parse(row, line). Returns an Event that is set at end of file.
+        done = threading.Event()
+        watcher = (pipe.fileno(), parse, row, done, [b""])
+        if self._selector:
+            os.set_blocking(watcher[0], False)
+            with self.lock:
+                self._pending.append(watcher)
+            os.write(self._wake_w, b"x")
+        else:
+            threading.Thread(target=self._pump, args=(watcher,), daemon=True).start()
+        return done
+
+    def _feed(self, watcher, data):
+        _, parse, row, done, buf = watcher
+        lines = re.split(rb"[\r\n]", buf[0] + data)
+        buf[0] = lines.pop() if data else b""
+        for line in lines:
+            if line.strip():
+                parse(row, line.decode(errors="replace").strip())
+        if not data:
+            done.set()
+
+    def _pump(self, watcher):
+        while True:
+            try:
+                data = os.read(watcher[0], 65536)
+            except OSError:
+                data = b""
+            self._feed(watcher, data)
+            if not data:
+                return
+
+    def _read_loop(self):
+        sel = self._selector
+        while not self._stop.is_set():
+            for key, _ in sel.select(timeout=0.5):
+                if key.data is None:
+                    os.read(self._wake_r, 4096)
+                    with self.lock:
+                        pending, self._pending = self._pending, []
+                    for watcher in pending:
+                        sel.register(watcher[0], selectors.EVENT_READ, watcher)
+                    continue
+                try:
+                    data = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    sel.unregister(key.fd)
+                self._feed(key.data, data)
+        for key in list(sel.get_map().values()):
+            if key.data is not None:
+                key.data[3].set()
+
+    # Rendering
+    def start(self):
+        targets = [self._render_loop] + ([self._read_loop] if self._selector else [])
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._selector:
+            os.write(self._wake_w, b"x")
+        for thread in self._threads:
+            thread.join()
+        if self._selector:
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+    def _render_loop(self):
+        while not self._stop.wait(self.interval):
+            self.render()
+        self.render(final=True)
+
+    def rate(self, now, received):
+        self.samples.append((now, received))
+        while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW:
+            self.samples.popleft()
+        then, before = self.samples[0]
+        return (received - before) / (now - then) if now > then else 0.0
+
+    def eta(self, now, rate, active):
+        finished = sum(self.finished.values())
+        if finished and self.total_jobs:
+            return (now - self.started) * (self.total_jobs - finished) / finished
+        left = sum(r.total - r.done for r in active if r.unit == "B" and r.total)
+        return left / rate if rate and left else None
+
+    def row_line(self, row, now, width):
+        if row.total:
+            pct = f"{min(100, int(row.done * 100 / row.total)):3d}%"
+            amount = f"{format_amount(row.done, row.unit)} / {format_amount(row.total, row.unit)}"
+        else:
+            pct, amount = "    ", format_amount(row.done, row.unit) if row.done else ""
+        elapsed = now - row.stage_started
+        speed = ""
+        if row.done and elapsed > 0:
+            speed = f"{row.done / elapsed / 1e6:.1f} MB/s" if row.unit == "B" else f"{row.done / elapsed:.1f}x"
+        name = row.name if len(row.name) <= 28 else row.name[:27] + "…"
+        return f"  {name:<28} {row.stage:<9}{pct}  {amount:<21} {speed}"[:width]
+
+    def render(self, final=False):
+        now = time.monotonic()
+        with self.lock:
+            messages, self.messages = self.messages, []
+            active = [r for r in self.rows.values() if r.ok is None]
+            received = sum(r.received for r in self.rows.values())
+            ok, failed = self.finished[True], self.finished[False]
+        rate = self.rate(now, received)
+        size = shutil.get_terminal_size((80, 24))
+        width = max(20, size.columns - 1)
+        max_rows = max(1, size.lines - 4)
+
+        lines = []
+        if not final:
+            lines = [self.row_line(r, now, width) for r in active[:max_rows]]
+            if len(active) > max_rows:
+                lines.append(f"  ... and {len(active) - max_rows} more")
+        eta = None if final else self.eta(now, rate, active)
+        lines.append(Style.BRIGHT + (
+            f"  {len(active)} running, {ok} done, {failed} failed of {self.total_jobs}"
+            f"  |  {rate / 1e6:.1f} MB/s  |  "
+            + (f"ETA {describe_span(eta)}" if eta is not None else
+               f"{describe_span(now - self.started)} elapsed")
+        )[:width] + Style.RESET_ALL)
+
+        out = [f"\x1b[{self.drawn}F"] if self.drawn else []
+        out += ["\x1b[2K" + m + "\n" for m in messages]
+        out += ["\x1b[2K" + line + "\n" for line in lines]
+        leftover = self.drawn - len(messages) - len(lines)
+        if leftover > 0:
+            out.append("\x1b[2K\n" * leftover + f"\x1b[{leftover}F")
+        self.drawn = 0 if final else len(lines)
+        try:
+            self.stream.write("".join(out))
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+
+def start_dashboard(total_jobs):
+    # Installs the dashboard as the message sink; returns the previous hook
+    # for stop_dashboard.
+    global DASHBOARD, LOG_HOOK
+    previous = LOG_HOOK
+    DASHBOARD = ProgressHub(LOG_STREAM, total_jobs).start()
+    LOG_HOOK = DASHBOARD.log
+    return previous
+
+def stop_dashboard(previous_hook):
+    global DASHBOARD, LOG_HOOK
+    if DASHBOARD:
+        hub, DASHBOARD = DASHBOARD, None
+        hub.close()
+    LOG_HOOK = previous_hook
+
+def job_row(job):
+    # Makes the job's dashboard row current in this thread; None when off.
+    row = DASHBOARD.row(id(job), job_name(job)) if DASHBOARD else None
+    _row_var.set(row)
+    return row
+
+# ——— Media Probe ——————————————————————————————————————————————————————
+# One ffprobe per file, memoized by (device, inode, size, mtime) in memory
+# and in probe.json in the cache dir, so later stages and re-runs reuse it,
+# and a file moved out of staging keeps its entry.
+PROBE_CACHE_ENTRIES = 2000
+_probe_memo = None
+_probe_lock = threading.Lock()
+
+def _probe_key(path):
+    st = os.stat(path)
+    return f"{st.st_dev}|{st.st_ino}|{st.st_size}|{st.st_mtime_ns}"
+
+def _probe_cache_path():
+    return os.path.join(cache_dir(), "probe.json")
+
+def _load_probe_memo():
+    global _probe_memo
+    if _probe_memo is None:
+        try:
+            with open(_probe_cache_path(), encoding="utf-8") as f:
+                _probe_memo = json.load(f)
+        except (OSError, ValueError):
+            _probe_memo = {}
+    return _probe_memo
+
+def _num(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_probe_output(data):
+    fmt = data.get("format", {})
+    streams = [{
+        "index": st.get("index"),
+        "type": st.get("codec_type"),
+        "codec": st.get("codec_name"),
+        "bit_rate": _num(st.get("bit_rate"), int),
+        "sample_rate": _num(st.get("sample_rate"), int),
+        "channels": _num(st.get("channels"), int),
+        "duration": _num(st.get("duration")),
+        "attached_pic": bool(st.get("disposition", {}).get("attached_pic")),
+    } for st in data.get("streams", [])]
+    audio = next((st for st in streams if st["type"] == "audio"), {})
+    return {
+        "format": fmt.get("format_name", ""),
+        "duration": _num(fmt.get("duration")) or audio.get("duration") or 0.0,
+        "size": _num(fmt.get("size"), int),
+        "bit_rate": audio.get("bit_rate") or _num(fmt.get("bit_rate"), int),
+        "codec": audio.get("codec"),
+        "sample_rate": audio.get("sample_rate"),
+        "channels": audio.get("channels"),
+        "streams": streams,
+        "attached_pics": [st["index"] for st in streams if st["attached_pic"]],
+        "has_video": any(st["type"] == "video" and not st["attached_pic"] for st in streams),
+    }
+
+def probe_media(path):
+    # Raises CalledProcessError when ffprobe can't read the file at all.
+    key = _probe_key(path)
+    with _probe_lock:
+        hit = _load_probe_memo().get(key)
+    if hit is not None:
+        return hit
+
+    with stage("probe"):
+        res = run_child(
             ["ffprobe", "-v", "error",
-             "-show_entries", "stream=duration",
-             "-of", "csv=p=0", path],
+             "-print_format", "json",
+             "-show_format", "-show_streams", path],
             stdout=subprocess.PIPE,
             stderr=subprocess.DEVNULL,
             check=True
         )
-        val2 = res2.stdout.decode().strip()
+    try:
+        info = parse_probe_output(json.loads(res.stdout.decode() or "{}"))
+    except ValueError:
+        info = parse_probe_output({})
+
+    with _probe_lock:
+        memo = _load_probe_memo()
+        memo[key] = info
+        for stale in list(memo)[:-PROBE_CACHE_ENTRIES]:
+            del memo[stale]
         try:
-            return float(val2) if val2 else 0.0
-        except ValueError:
-            return 0.0
+            tmp = _probe_cache_path() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(memo, f)
+            os.replace(tmp, _probe_cache_path())
+        except OSError:
+            pass
+    return info
+
+def get_media_duration(path):
+    return probe_media(path)["duration"]
 
-def run_ffmpeg_with_progress(cmd, total_secs):
+def run_ffmpeg_with_progress(cmd, total_secs, show=True, feed=None):
+    # `feed` is an optional iterable of byte chunks written to ffmpeg's stdin
+    # (for `-i pipe:0`) from a helper thread while progress is read here.
     full_cmd = cmd + ["-progress", "pipe:1", "-nostats"]
-    p = subprocess.Popen(
+    p = popen(
         full_cmd,
+        stdin=subprocess.PIPE if feed is not None else None,
         stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        text=True,
-        bufsize=1
+        stderr=subprocess.DEVNULL
     )
+    feed_errors = []
+
+    def pump():
+        try:
+            for chunk in feed:
+                p.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except BaseException as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                p.stdin.close()
+            except OSError:
+                pass
+
+    pump_thread = None
+    if feed is not None:
+        pump_thread = threading.Thread(target=pump, daemon=True)
+        pump_thread.start()
+    row = _row_var.get() if DASHBOARD else None
     bar = tqdm(
         total=max(1.0, total_secs),
         ncols=80,
         leave=True,
-        bar_format='{percentage:3.0f}%|{bar}|'
+        bar_format='{percentage:3.0f}%|{bar}|',
+        disable=not show or row is not None
     )
     try:
-        while True:
-            line = p.stdout.readline()
-            if not line:
-                break
-            line = line.strip()
-            if line.startswith("out_time_ms="):
-                ms = int(line.split("=", 1)[1])
-                sec = ms / 1_000_000
-                bar.update(max(0.0, sec - bar.n))
-            elif line.startswith("progress=") and line.endswith("end"):
-                break
+        if row:
+            row.transfer(total_secs or None, unit="s")
+            DASHBOARD.watch(p.stdout, parse_ffmpeg_progress, row).wait()
+        else:
+            while True:
+                line = p.stdout.readline()
+                if not line:
+                    break
+                line = line.decode(errors="replace").strip()
+                if line.startswith("out_time_ms="):
+                    ms = int(line.split("=", 1)[1])
+                    sec = ms / 1_000_000
+                    bar.update(max(0.0, sec - bar.n))
+                elif line.startswith("progress=") and line.endswith("end"):
+                    break
         p.wait()
+        charge_child(p)
+        if pump_thread:
+            pump_thread.join()
     finally:
         bar.close()
+    if feed_errors:
+        raise feed_errors[0]
     if p.returncode != 0:
         raise subprocess.CalledProcessError(p.returncode, full_cmd)
 
-def convert_to_mp3(path):
-    mp3_path = os.path.splitext(path)[0] + ".mp3"
-    dur = get_media_duration(path)
-    print_info("Converting to MP3...")
-    try:
-        run_ffmpeg_with_progress([
-            "ffmpeg", "-hide_banner",
-            "-i", path, "-vn",
-            "-acodec", "libmp3lame",
-            "-b:a", "320k",
-            mp3_path
-        ], total_secs=dur)
-    except subprocess.CalledProcessError:
-        print_error(f"ffmpeg failed to convert '{path}' to MP3.")
-        return None
-    try:
-        os.remove(path)
-    except OSError:
-        pass
-    return mp3_path
+OUTPUT_POLICY = "mp3"
 
-def process_and_embed_image(mp3_path, img_url, hdrs, cookie=None, keep_original=False):
-    tmp_img = None
-    tmp_conv = None
-    out_path = os.path.splitext(mp3_path)[0] + "_cover.mp3"
+def plan_conversion(path, info, policy=None):
+    # Returns (action, out_path) with action one of "keep", "copy", "transcode".
+    # Stream copy/remux is I/O-bound and takes seconds; a libmp3lame encode
+    # takes minutes of CPU, so it is only chosen when the policy requires it.
+    policy = policy or OUTPUT_POLICY
+    root, ext = os.path.splitext(path)
+    codec = info["codec"]
+    if codec == "mp3":
+        if ext.lower() == ".mp3" and not info["has_video"]:
+            return "keep", path
+        return "copy", root + ".mp3"
+    if policy == "native" and codec in ("aac", "alac"):
+        if ext.lower() == ".m4a" and not info["has_video"]:
+            return "keep", path
+        return "copy", root + ".m4a"
+    return "transcode", root + ".mp3"
 
-    print_info("Downloading image...")
-    src_ext = os.path.splitext(img_url.split("?", 1)[0])[1].lower()
-    src_ext = src_ext if src_ext in (".jpg", ".jpeg", ".png", ".webp", ".heic") else ".jpg"
-    tmp_img = tempfile.NamedTemporaryFile(suffix=src_ext, delete=False).name
-    ok = download_with_headers(img_url, tmp_img, hdrs, cookie=cookie)
-    if not ok:
-        print_error("Image download failed.")
-        if tmp_img and os.path.exists(tmp_img):
-            os.remove(tmp_img)
+def conversion_command(source, info, action, out_path, cover=None):
+    # ffmpeg argv for a "copy" or "transcode" plan; returns (cmd, out_path),
+    # where out_path becomes name_cover.ext when a cover is attached.
+    if action == "copy":
+        codec_args = ["-c:a", "copy"]
+    else:
+        codec_args = ["-acodec", "libmp3lame", "-b:a", "320k"]
+        # MP3 tops out at 48 kHz; hi-res sources must be resampled.
+        if (info["sample_rate"] or 0) > 48000:
+            codec_args += ["-ar", "48000"]
+    if out_path.lower().endswith(".m4a"):
+        codec_args += ["-movflags", "+faststart"]
+    if cover:
+        out_path = cover_path_for(out_path)
+    codec_args += id3_padding_args(out_path)
+    if cover:
+        # The cover bytes go to ffmpeg's stdin (see cover_input_args).
+        inputs = ["-i", source, *cover_input_args(cover[1]), "-map", "0:a", "-map", "1:v"]
+        codec_args += cover_output_args(cover[1])
+    else:
+        inputs = ["-i", source, "-vn"]
+    return ["ffmpeg", "-hide_banner", *inputs, *codec_args, out_path], out_path
+
+def convert_audio(path, show_progress=True, policy=None, cover=None):
+    # With a prepared `cover` the picture is attached in the same ffmpeg run,
+    # writing name_cover.ext directly instead of a second full remux. If the
+    # source needs no conversion the input path is returned unchanged and the
+    # cover is left for embed_cover_art.
+    try:
+        info = probe_media(path)
+    except (subprocess.CalledProcessError, OSError):
+        print_error(f"ffprobe could not read '{path}'.")
         return None
+    action, out_path = plan_conversion(path, info, policy)
+    if action == "keep":
+        return path
 
-    print_info("Preparing image for embedding...")
-    is_png = src_ext == ".png"
-    is_jpg = src_ext in (".jpg", ".jpeg")
-
-    if not (is_png or is_jpg):
-        try:
-            tmp_conv = tempfile.NamedTemporaryFile(suffix=".png", delete=False).name
-            subprocess.run([
-                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
-                "-i", tmp_img, "-c:v", "png", tmp_conv
-            ], check=True)
-            embed_path = tmp_conv
-            codec = "png"
-        except subprocess.CalledProcessError as e:
-            print_error(f"Image conversion failed: {e}")
-            for p in (tmp_img, tmp_conv):
-                if p and os.path.exists(p): os.remove(p)
+    with stage("convert") as st:
+        st.bytes = os.path.getsize(path)
+        source, chunked, padding = path, False, None
+        if action == "copy":
+            kbps = f" {info['bit_rate'] // 1000} kb/s" if info["bit_rate"] else ""
+            print_info(f"Remuxing {info['codec']}{kbps} audio without re-encoding: {os.path.basename(path)}")
+        else:
+            print_info(f"Converting to MP3: {os.path.basename(path)}")
+            plan = parallel_encode_plan(info)
+            if plan:
+                # The chunks come back as MP3 frames; the ffmpeg run below only
+                # adds the Xing header, tags and cover.
+                try:
+                    source, padding = encode_mp3_chunks(path, *plan, show=show_progress)
+                except (subprocess.CalledProcessError, ValueError):
+                    print_error(f"ffmpeg failed to convert '{path}'.")
+                    st.ok = False
+                    return None
+                chunked = True
+        cmd, out_path = conversion_command(
+            source, info, "copy" if chunked else action, out_path, cover=cover
+        )
+        try:
+            run_ffmpeg_with_progress(cmd, total_secs=info["duration"], show=show_progress and not chunked,
+                                     feed=[cover[0]] if cover else None)
+        except subprocess.CalledProcessError:
+            print_error(f"ffmpeg failed to convert '{path}'.")
+            st.ok = False
             return None
-    else:
-        embed_path = tmp_img
-        codec = "mjpeg" if is_jpg else "png"
-
-    print_info("Embedding cover into MP3...")
-    try:
-        subprocess.run([
-            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
-            "-i", mp3_path, "-i", embed_path,
-            "-map", "0:a", "-map", "1:v",
-            "-c:a", "copy", "-c:v", codec,
-            "-disposition:v:0", "attached_pic",
-            "-id3v2_version", "3",
-            "-metadata:s:v", "title=",
-            out_path
-        ], check=True)
-    except subprocess.CalledProcessError as e:
-        print_error(f"ffmpeg failed to embed cover art: {e}")
-        return None
-    finally:
-        for p in (tmp_img, tmp_conv):
-            if p and os.path.exists(p): os.remove(p)
-        if not keep_original:
+        finally:
+            if chunked:
+                remove_temp_files([source])
+        if padding is not None:
             try:
-                if os.path.exists(mp3_path):
-                    os.remove(mp3_path)
+                set_lame_padding(out_path, padding)
             except OSError:
                 pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return out_path
 
-    return out_path
+def convert_to_mp3(path, show_progress=True):
+    return convert_audio(path, show_progress=show_progress, policy="mp3")
 
-# ——— Core Download Flow —————————————————————————————————————————————
-def run_download(base_dir, embed_cover, keep_original=False):
-    print_info("\nPaste your cURL (Windows) and press Enter twice. 'q' to quit.")
-    lines = []
-    while True:
-        line = input()
-        if not line.strip():
-            break
-        if line.strip().lower() == "q":
-            print_info("Exiting.")
-            sys.exit(0)
-        lines.append(line)
+# ——— Parallel Encode ———————————————————————————————————————————————————
+# Long episodes can be encoded as time chunks in parallel ffmpeg processes.
+# Chunks start on MP3 frame boundaries (1152 samples) and are encoded with a
+# few frames of pre/post-roll and no bit reservoir, so every frame is
+# self-contained and the extra frames can be cut off again. The encoder delay
+# is the same in every chunk, so frame k of a chunk lines up with frame k of a
+# single-pass encode. The first chunk keeps its LAME Info frame (which carries
+# that delay), and the final `-c:a copy` pass in convert_audio rewrites its
+# frame count for the joined stream. That pass can't know the end padding, so
+# it is taken from the last chunk's own Info frame (the stream ends at the
+# same sample either way) and patched into the LAME tag afterwards.
+PARALLEL_ENCODE = 0              # number of chunks; 0 = single-pass encode
+PARALLEL_MIN_SECS = 20 * 60
+MP3_FRAME_SAMPLES = 1152
+ENCODE_ROLL_FRAMES = 4
 
-    raw = " ".join(lines).replace("^", "")
-    m = re.search(r'(https?://[^\s"\'\\]+)', raw)
-    if not m:
-        print_error("No URL found.")
-        return
-    url = m.group(1)
+_MP3_KBPS = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MP3_RATES = (44100, 48000, 32000)
+
+def mp3_frames(data):
+    # Yields (offset, length) of each MPEG-1 Layer III frame in `data`.
+    pos = 0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        kbps_idx, rate_idx = b2 >> 4, (b2 >> 2) & 3
+        if data[pos] != 0xFF or b1 & 0xFE != 0xFA or kbps_idx in (0, 15) or rate_idx == 3:
+            raise ValueError(f"lost MP3 frame sync at byte {pos}")
+        length = 144000 * _MP3_KBPS[kbps_idx] // _MP3_RATES[rate_idx] + ((b2 >> 1) & 1)
+        yield pos, length
+        pos += length
+
+def crc16(data):
+    # CRC-16/ARC, as used for the LAME tag.
+    crc = 0
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def lame_tag_offset(frame):
+    # Offset of the LAME extension in a Xing/Info frame, or None.
+    pos = 4 + (17 if frame[3] >> 6 == 3 else 32)
+    if frame[pos:pos + 4] not in (b"Xing", b"Info") or len(frame) < pos + 8:
+        return None
+    flags = struct.unpack(">I", frame[pos + 4:pos + 8])[0]
+    pos += 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+    return pos if len(frame) >= pos + 36 else None
+
+def lame_padding(frame):
+    # The end padding (in samples) recorded in a Xing/Info frame, or None.
+    pos = lame_tag_offset(frame)
+    if pos is None:
+        return None
+    return int.from_bytes(frame[pos + 21:pos + 24], "big") & 0xFFF
+
+def set_lame_padding(path, padding):
+    # Rewrites the end padding in the file's LAME tag and the tag's CRC (over
+    # every byte before it, as LAME writes it and decoders check it).
+    # Returns False when the file has no LAME tag.
+    start = audio_payload_range(path)[0]
+    with open(path, "r+b") as f:
+        f.seek(start)
+        frame = bytearray(f.read(512))
+        pos = lame_tag_offset(frame) if len(frame) >= 4 and frame[0] == 0xFF else None
+        if pos is None:
+            return False
+        v = int.from_bytes(frame[pos + 21:pos + 24], "big") & ~0xFFF | min(padding, 0xFFF)
+        frame[pos + 21:pos + 24] = v.to_bytes(3, "big")
+        frame[pos + 34:pos + 36] = crc16(frame[:pos + 34]).to_bytes(2, "big")
+        f.seek(start)
+        f.write(frame[:pos + 36])
+    return True
+
+def parallel_encode_plan(info, chunks=None):
+    # Returns (rate, [(first_frame, frame_count), ...]) or None when chunking
+    # is off, the episode is short, or the output rate isn't an MPEG-1 rate
+    # (lower rates use 576-sample frames).
+    chunks = PARALLEL_ENCODE if chunks is None else chunks
+    rate = min(info["sample_rate"] or 0, 48000)
+    if chunks < 2 or rate not in _MP3_RATES or info["duration"] < PARALLEL_MIN_SECS:
+        return None
+    total = int(info["duration"] * rate) // MP3_FRAME_SAMPLES + 1
+    per = -(-total // chunks)
+    return rate, [(first, min(per, total - first)) for first in range(0, total, per)]
+
+def encode_mp3_chunk(path, rate, first, count, last):
+    # Encodes frames [first, first + count) plus roll; returns (data, padding)
+    # with the raw frames belonging to the chunk (led by the Info frame for
+    # the first chunk) and, for the last chunk, the stream's end padding.
+    pre = min(ENCODE_ROLL_FRAMES, first)
+    cmd = ["ffmpeg", "-hide_banner", "-v", "error", "-y"]
+    if first:
+        # Even `-ss 0` shifts the decoder's priming, so chunk 0 reads plainly.
+        cmd += ["-ss", f"{(first - pre) * MP3_FRAME_SAMPLES / rate:.6f}"]
+    cmd += ["-i", path]
+    if not last:
+        span = (pre + count + ENCODE_ROLL_FRAMES) * MP3_FRAME_SAMPLES
+        cmd += ["-t", f"{span / rate:.6f}"]
+    cmd += ["-vn", "-ar", str(rate),
+            "-acodec", "libmp3lame", "-b:a", "320k", "-reservoir", "0",
+            "-write_xing", "1" if first == 0 or last else "0", "-id3v2_version", "0"]
+    # The Info frame is only written to seekable output, so no pipe:1 here.
+    fd, tmp = tempfile.mkstemp(suffix=".mp3", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        run_child(cmd + ["-f", "mp3", tmp], stdout=subprocess.DEVNULL,
+                  stderr=subprocess.DEVNULL, check=True)
+        with open(tmp, "rb") as f:
+            data = f.read()
+    finally:
+        remove_temp_files([tmp])
+    frames = list(mp3_frames(data))
+    padding = None
+    if first == 0 or last:
+        # The Info frame comes ahead of the pre-roll.
+        info_at, info_len = frames.pop(0)
+        if last:
+            padding = lame_padding(data[info_at:info_at + info_len])
+    keep = frames[pre:] if last else frames[pre:pre + count]
+    if not keep:
+        raise ValueError(f"chunk at frame {first} came back empty")
+    return data[0 if first == 0 else keep[0][0]:keep[-1][0] + keep[-1][1]], padding
+
+def encode_mp3_chunks(path, rate, chunks, show=True):
+    # Runs one ffmpeg per chunk and joins the frames into a temp .mp3.
+    # Returns (temp_path, end_padding); the padding is None if unknown.
+    print_info(f"Encoding in {len(chunks)} parallel chunks.")
+    bar = tqdm(total=len(chunks), ncols=80, leave=True,
+               bar_format='{percentage:3.0f}%|{bar}|', disable=not show)
+    workers = min(len(chunks), os.cpu_count() or 1)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each chunk runs in a copy of this context so its ffmpeg CPU time
+            # is charged to the caller's "convert" stage.
+            futures = [
+                pool.submit(contextvars.copy_context().run, encode_mp3_chunk,
+                            path, rate, first, count, i == len(chunks) - 1)
+                for i, (first, count) in enumerate(chunks)
+            ]
+            for fut in futures:
+                fut.add_done_callback(lambda _: bar.update(1))
+            parts = [fut.result() for fut in futures]
+    finally:
+        bar.close()
+    fd, joined = tempfile.mkstemp(suffix=".mp3", dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "wb") as f:
+        for part, _ in parts:
+            f.write(part)
+    return joined, parts[-1][1]
+
+# ——— Streaming Transcode ———————————————————————————————————————————————
+STREAM_TRANSCODE = False
+
+def mp4_head_info(buf):
+    # Walks the top-level MP4 boxes in `buf`. Returns (streamable, duration):
+    # streamable is True when `moov` comes before `mdat` (a "faststart" file
+    # ffmpeg can decode from a pipe), False when it doesn't, and None when the
+    # buffer is too short to tell.
+    pos = 0
+    while pos + 8 <= len(buf):
+        size, kind = struct.unpack(">I4s", buf[pos:pos + 8])
+        header = 8
+        if size == 1:
+            if pos + 16 > len(buf):
+                return None, 0.0
+            size = struct.unpack(">Q", buf[pos + 8:pos + 16])[0]
+            header = 16
+        if kind == b"mdat":
+            return False, 0.0
+        if kind == b"moov":
+            if pos + header + 64 > len(buf):
+                return None, 0.0
+            return True, mvhd_duration(buf[pos + header:pos + size])
+        if size < header:
+            return False, 0.0
+        pos += size
+    return None, 0.0
+
+def mvhd_duration(moov):
+    i = moov.find(b"mvhd")
+    if i < 4 or i + 36 > len(moov):
+        return 0.0
+    body = moov[i + 4:]
+    if body[0] == 1:
+        timescale, duration = struct.unpack(">IQ", body[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", body[12:20])
+    return duration / timescale if timescale else 0.0
+
+def stream_to_mp3(url, hdrs, mp3_path, cookie=None, show_progress=True, cover=None,
+                  max_head=4 * 1024 * 1024):
+    # Pipes the HTTP body straight into ffmpeg so the encode runs while bytes
+    # are still arriving. Returns None when the source can't be decoded from a
+    # pipe (not a faststart MP4, or not media at all) so the caller can fall
+    # back to download-then-convert.
+    if not isinstance(TRANSPORT, HttpTransport):
+        return None
+    hdrs = [h for h in hdrs if not h.lower().startswith("range:")] + ["Range: bytes=0-"]
+    try:
+        key, conn, resp = TRANSPORT.open(url, hdrs, cookie=cookie)
+    except (DownloadError, http.client.HTTPException, OSError):
+        return None
+
+    head, streamable, dur = b"", None, 0.0
+    try:
+        while streamable is None and len(head) < max_head:
+            chunk = resp.read(64 * 1024)
+            if not chunk:
+                break
+            head += chunk
+            streamable, dur = mp4_head_info(head)
+    except (http.client.HTTPException, OSError):
+        streamable = False
+    if not streamable:
+        conn.close()
+        return None
+
+    length = resp.getheader("Content-Length") or ""
+    expected = int(length) if length.isdigit() else None
+
+    row = _row_var.get()
+
+    def body():
+        received = len(head)
+        yield head
+        while True:
+            chunk = resp.read(TRANSPORT.chunk_size)
+            if not chunk:
+                break
+            received += len(chunk)
+            if row:
+                row.received += len(chunk)
+            yield chunk
+        if expected is not None and received < expected:
+            raise DownloadError(f"Connection closed after {received} of {expected} bytes")
+
+    print_info(f"Streaming into MP3: {os.path.basename(mp3_path)}")
+    try:
+        run_ffmpeg_with_progress([
+            "ffmpeg", "-hide_banner", "-y",
+            "-i", "pipe:0", "-vn",
+            "-acodec", "libmp3lame",
+            "-b:a", "320k",
+            *id3_padding_args(mp3_path),
+            mp3_path
+        ], total_secs=dur, show=show_progress, feed=body())
+    except (subprocess.CalledProcessError, DownloadError, http.client.HTTPException, OSError):
+        conn.close()
+        remove_temp_files([mp3_path])
+        return None
+    TRANSPORT.finish(key, conn, resp)
+    if cover:
+        # stdin carries the audio, so the cover goes into the padded ID3 tag.
+        try:
+            write_id3_cover(mp3_path, cover[0], cover_mime(cover[1]))
+        except (OSError, MutagenError) as e:
+            print_error(f"Could not write cover tag: {e}")
+            remove_temp_files([mp3_path])
+            return None
+    return mp3_path
+
+# ——— Tag Writing ————————————————————————————————————————————————————
+# MP3s are written with ID3_PADDING bytes of free space in the ID3 header, so
+# a later cover or tag change fits inside the existing tag and mutagen only
+# rewrites the header instead of moving the audio behind it.
+ID3_PADDING = 512 * 1024
+TAG_WRITER = "mutagen" if ID3 is not None else "ffmpeg"
+
+def id3_padding_args(out_path):
+    if out_path.lower().endswith(".mp3"):
+        return ["-id3v2_version", "3", "-metadata_header_padding", str(ID3_PADDING)]
+    return []
+
+def keep_or_reserve_padding(info):
+    return info.padding if info.padding >= 0 else ID3_PADDING
+
+def write_id3_cover(path, data, mime):
+    try:
+        tags = ID3(path)
+    except ID3NoHeaderError:
+        tags = ID3()
+    tags.delall("APIC")
+    # Blank description and picture type "Other", matching the ffmpeg path.
+    tags.add(APIC(encoding=3, mime=mime, type=0, desc="", data=data))
+    tags.save(path, v2_version=3, padding=keep_or_reserve_padding)
+
+def embed_cover_in_place(audio_path, out_path, data, codec, keep_original=False):
+    try:
+        if keep_original:
+            # A reflink shares the audio blocks; only the tag gets rewritten.
+            clone_file(audio_path, out_path)
+        else:
+            os.replace(audio_path, out_path)
+        write_id3_cover(out_path, data, cover_mime(codec))
+    except (OSError, MutagenError) as e:
+        print_error(f"Could not write cover tag: {e}")
+        if os.path.exists(out_path):
+            if keep_original:
+                os.remove(out_path)
+            else:
+                os.replace(out_path, audio_path)
+        return None
+    return out_path
+
+# ——— Cover Art ————————————————————————————————————————————————————————
+# Covers stay in memory from download to embedding: a cover is (data, codec)
+# with codec "mjpeg" or "png", ffmpeg reads it from stdin and writes
+# conversions to stdout, and mutagen takes the bytes directly.
+COVER_MAX_BYTES = 20 * 1024 * 1024
+
+def cover_codec(data):
+    # Codec for images that can be embedded as they are, else None.
+    if data.startswith(b"\xff\xd8\xff"):
+        return "mjpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    return None
+
+def cover_mime(codec):
+    return "image/jpeg" if codec == "mjpeg" else "image/png"
+
+def cover_input_args(codec):
+    # ffmpeg input for cover bytes written to its stdin.
+    return ["-f", "jpeg_pipe" if codec == "mjpeg" else "png_pipe", "-i", "pipe:0"]
+
+def download_cover_image(img_url, hdrs, cookie=None):
+    # Returns the image bytes or None.
+    print_info("Downloading image...")
+    try:
+        return fetch_bytes(img_url, hdrs, cookie=cookie, limit=COVER_MAX_BYTES)
+    except (StubResponseError, DownloadFailed) as e:
+        print_error(f"Image download failed: {e}")
+        return None
+
+def cover_png_command():
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0", "-frames:v", "1", "-c:v", "png", "-f", "image2pipe", "pipe:1"]
+
+def prepare_cover_image(data):
+    # Keeps JPEG/PNG as they are and converts anything else (WebP, ...) to
+    # PNG. Returns (data, codec) or None.
+    print_info("Preparing image for embedding...")
+    codec = cover_codec(data)
+    if codec:
+        return data, codec
+    try:
+        png = run_child(cover_png_command(), input=data, stdout=subprocess.PIPE, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        print_error(f"Image conversion failed: {e}")
+        return None
+    if not png:
+        print_error("Image conversion failed: ffmpeg returned no image.")
+        return None
+    return png, "png"
+
+def fetch_cover(img_url, hdrs, cookie=None):
+    # Downloads the cover and makes sure it is JPEG or PNG. Returns
+    # (data, codec) or None.
+    with stage("cover") as st:
+        cover = load_cover(img_url, hdrs, cookie=cookie)
+        st.ok = cover is not None
+        st.bytes = len(cover[0]) if cover else None
+    return cover
+
+def load_cover(img_url, hdrs, cookie=None):
+    cache = get_cover_cache()
+    if cache:
+        return cache.fetch(img_url, hdrs, cookie=cookie)
+    data = download_cover_image(img_url, hdrs, cookie=cookie)
+    return prepare_cover_image(data) if data else None
+
+def remove_temp_files(paths):
+    for p in paths:
+        if p and os.path.exists(p):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+# ——— Cover Cache ———————————————————————————————————————————————————————
+def cache_dir():
+    base = os.environ.get("AIOD_CACHE_DIR")
+    if not base:
+        if os.name == "nt":
+            base = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "AIOD", "cache")
+        else:
+            base = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "aiod")
+    os.makedirs(base, exist_ok=True)
+    return base
+
+class CoverCache:
+    # Covers are stored by content hash, both the raw download and the
+    # embed-ready JPEG/PNG, and looked up by URL first. A season sharing one
+    # image therefore downloads and converts it once; a new (e.g. re-signed)
+    # URL for the same image costs a download but no conversion. Least
+    # recently used entries are evicted past max_bytes, except ones used in
+    # the last `min_age` seconds, so a running batch keeps its covers cached.
+    def __init__(self, root, max_bytes=200 * 1024 * 1024, min_age=3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        os.makedirs(root, exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {"urls": {}, "entries": {}}
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+
+    def _write(self, name, data):
+        tmp = os.path.join(self.root, name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.root, name))
+
+    def _read_prepared(self, entry):
+        try:
+            with open(os.path.join(self.root, entry["prepared"]), "rb") as f:
+                return f.read(), entry["codec"]
+        except OSError:
+            return None
+
+    def _entry_files(self, entry):
+        return {os.path.join(self.root, entry["raw"]), os.path.join(self.root, entry["prepared"])}
+
+    def _touch(self, url, digest, entry):
+        entry["last_used"] = time.time()
+        self._index["entries"][digest] = entry
+        self._index["urls"][url] = digest
+
+    def lookup(self, url):
+        with self._lock:
+            digest = self._index["urls"].get(url)
+            entry = self._index["entries"].get(digest)
+            if not entry or not all(os.path.exists(p) for p in self._entry_files(entry)):
+                return None
+            self._touch(url, digest, entry)
+            self._save()
+        return self._read_prepared(entry)
+
+    def store(self, url, data):
+        # Returns the embed-ready (data, codec) or None.
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._index["entries"].get(digest)
+            if entry and not all(os.path.exists(p) for p in self._entry_files(entry)):
+                entry = None
+        prepared = self._read_prepared(entry) if entry else None
+        if not prepared:
+            prepared = prepare_cover_image(data)
+            if not prepared:
+                return None
+            codec = cover_codec(data)
+            raw_name = digest + {"mjpeg": ".jpg", "png": ".png"}.get(codec, ".img")
+            self._write(raw_name, data)
+            prepared_name = raw_name if codec else digest + ".prepared.png"
+            if not codec:
+                self._write(prepared_name, prepared[0])
+            entry = {"raw": raw_name, "prepared": prepared_name, "codec": prepared[1], "size": 0}
+            entry["size"] = sum(os.path.getsize(p) for p in self._entry_files(entry))
+        with self._lock:
+            self._touch(url, digest, entry)
+            self._evict(keep=digest)
+            self._save()
+        return prepared
+
+    def _evict(self, keep):
+        entries = self._index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        now = time.time()
+        for digest, entry in sorted(entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes or now - entry["last_used"] < self.min_age:
+                break
+            if digest == keep:
+                continue
+            remove_temp_files(self._entry_files(entry))
+            total -= entry["size"]
+            del entries[digest]
+        self._index["urls"] = {u: d for u, d in self._index["urls"].items() if d in entries}
+
+    def fetch(self, img_url, hdrs, cookie=None):
+        # Concurrent jobs asking for the same URL wait for one download.
+        with self._lock:
+            url_lock = self._url_locks.setdefault(img_url, threading.Lock())
+        with url_lock:
+            hit = self.lookup(img_url)
+            if hit:
+                print_info("Using cached cover image.")
+                return hit
+            data = download_cover_image(img_url, hdrs, cookie=cookie)
+            return self.store(img_url, data) if data else None
+
+COVER_CACHE_MB = 200
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+def get_cover_cache():
+    global _cover_cache
+    if COVER_CACHE_MB <= 0:
+        return None
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            _cover_cache = CoverCache(os.path.join(cache_dir(), "covers"),
+                                      max_bytes=COVER_CACHE_MB * 1024 * 1024)
+    return _cover_cache
+
+def cover_output_args(codec):
+    # Attached picture with a blank APIC description. JPEG and PNG covers are
+    # stored as they are, anything else is encoded. The ID3v2.3 header for
+    # MP3 output comes from id3_padding_args.
+    return [
+        "-c:v", "copy" if codec in ("mjpeg", "png") else codec,
+        "-disposition:v:0", "attached_pic",
+        "-metadata:s:v", "title=",
+    ]
+
+def cover_path_for(path):
+    root, ext = os.path.splitext(path)
+    return root + "_cover" + ext
+
+def cover_remux_command(audio_path, codec, out_path):
+    # The cover bytes go to ffmpeg's stdin.
+    return [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-i", audio_path, *cover_input_args(codec),
+        "-map", "0:a", "-map", "1:v",
+        "-c:a", "copy",
+        *cover_output_args(codec),
+        *id3_padding_args(out_path),
+        out_path
+    ]
+
+def embed_cover_art(audio_path, cover, keep_original=False):
+    with stage("embed") as st:
+        out_path = attach_cover(audio_path, cover, keep_original)
+        st.ok = out_path is not None
+        st.bytes = os.path.getsize(out_path) if out_path else None
+    return out_path
+
+def attach_cover(audio_path, cover, keep_original=False):
+    data, codec = cover
+    out_path = cover_path_for(audio_path)
+    ext = os.path.splitext(audio_path)[1]
+
+    print_info(f"Embedding cover into {ext.lstrip('.').upper()}...")
+    if TAG_WRITER == "mutagen" and ext.lower() == ".mp3":
+        return embed_cover_in_place(audio_path, out_path, data, codec, keep_original)
+    try:
+        run_child(cover_remux_command(audio_path, codec, out_path), input=data, check=True)
+    except subprocess.CalledProcessError as e:
+        print_error(f"ffmpeg failed to embed cover art: {e}")
+        remove_temp_files([out_path])
+        return None
+
+    if not keep_original:
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+    return out_path
+
+def process_and_embed_image(mp3_path, img_url, hdrs, cookie=None, keep_original=False):
+    cover = fetch_cover(img_url, hdrs, cookie=cookie)
+    if not cover:
+        return None
+    return embed_cover_art(mp3_path, cover, keep_original=keep_original)
+
+# ——— Download Manifest —————————————————————————————————————————————————
+class Manifest:
+    # SQLite record of finished episodes: one row per (url_key, file), with
+    # the content hash, size and duration. Pasting an episode again finds the
+    # earlier file before any network I/O; a copy in another folder is
+    # hardlinked (or copied across drives) into the current one.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS episodes ("
+                " url_key TEXT NOT NULL, path TEXT NOT NULL, sha256 TEXT NOT NULL,"
+                " audio_sha256 TEXT, size INTEGER NOT NULL, duration REAL,"
+                " created REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (url_key, path))"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(episodes)")]
+            if "audio_sha256" not in columns:
+                self._db.execute("ALTER TABLE episodes ADD COLUMN audio_sha256 TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS episodes_sha256 ON episodes (sha256)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS episodes_audio ON episodes (audio_sha256)")
+
+    def _rows(self, where, arg):
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT url_key, path, sha256, audio_sha256, size, duration FROM episodes "
+                f"WHERE {where} = ? ORDER BY updated DESC", (arg,)
+            )
+            return [dict(zip(("url_key", "path", "sha256", "audio_sha256", "size", "duration"), row))
+                    for row in cur.fetchall()]
+
+    def _forget(self, key, path):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM episodes WHERE url_key = ? AND path = ?", (key, path))
+
+    def same_audio(self, audio_sha256):
+        return [row["path"] for row in self._rows("audio_sha256", audio_sha256)
+                if os.path.isfile(row["path"])]
+
+    def record(self, url, path, hashes=None):
+        # Returns the (sha256, audio_sha256) pair that was stored.
+        path = os.path.abspath(path)
+        sha256, audio = hashes or content_hashes(path)
+        try:
+            duration = probe_media(path)["duration"]
+        except (subprocess.CalledProcessError, OSError):
+            duration = None
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO episodes (url_key, path, sha256, audio_sha256, size, duration,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (url_key, path) DO UPDATE SET sha256 = excluded.sha256,"
+                " audio_sha256 = excluded.audio_sha256, size = excluded.size,"
+                " duration = excluded.duration, updated = excluded.updated",
+                (url_key(url), path, sha256, audio, os.path.getsize(path), duration, now, now)
+            )
+        return sha256, audio
+
+    def find(self, url, base_dir):
+        # Returns (path, how) with how "exists" or "linked", or None.
+        key = url_key(url)
+        alive = []
+        for row in self._rows("url_key", key):
+            if os.path.isfile(row["path"]) and os.path.getsize(row["path"]) == row["size"]:
+                alive.append(row)
+            else:
+                self._forget(key, row["path"])
+        if not alive:
+            return None
+        folder = os.path.normcase(os.path.abspath(base_dir))
+        for row in alive:
+            if os.path.normcase(os.path.dirname(row["path"])) == folder:
+                return row["path"], "exists"
+
+        src = alive[0]
+        target = unique_path(os.path.join(base_dir, os.path.basename(src["path"])))
+        tmp = target + ".link"
+        try:
+            # Cloned beside the reserved name, then renamed over it. Hardlinks
+            # only with DEDUPE_LINKS = "hardlink" (their tags change together).
+            try:
+                reflink(src["path"], tmp)
+            except OSError:
+                remove_temp_files([tmp])
+                if DEDUPE_LINKS == "hardlink":
+                    try:
+                        os.link(src["path"], tmp)
+                    except OSError:
+                        shutil.copy2(src["path"], tmp)
+                else:
+                    shutil.copy2(src["path"], tmp)
+            os.replace(tmp, target)
+        except OSError:
+            remove_temp_files([tmp, target])
+            return src["path"], "exists"
+        self.record(url, target)
+        return target, "linked"
+
+MANIFEST_ENABLED = True
+REDOWNLOAD = False
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_manifest():
+    global _manifest
+    if not MANIFEST_ENABLED:
+        return None
+    with _manifest_lock:
+        if _manifest is None:
+            try:
+                _manifest = Manifest(os.path.join(cache_dir(), "manifest.sqlite3"))
+            except sqlite3.Error as e:
+                print_error(f"Download manifest unavailable: {e}")
+                return None
+    return _manifest
+
+def find_downloaded(base_dir, url):
+    manifest = get_manifest()
+    if not manifest or REDOWNLOAD:
+        return None
+    try:
+        return manifest.find(url, base_dir)
+    except sqlite3.Error:
+        return None
+
+def record_download(url, path, related=()):
+    # Records the finished file, then collapses it with earlier copies of the
+    # same audio and with `related` files (the plain MP3 kept next to a
+    # _cover one).
+    manifest = get_manifest()
+    if not path:
+        return
+    with stage("record") as st:
+        st.bytes = os.path.getsize(path)
+        others = [p for p in related if p and os.path.isfile(p)]
+        known = {}
+        if manifest:
+            try:
+                hashes = manifest.record(url, path)
+                known[os.path.abspath(path)] = hashes
+                others += manifest.same_audio(hashes[1])
+            except (sqlite3.Error, OSError) as e:
+                st.ok = False
+                print_error(f"Could not update download manifest: {e}")
+        if DEDUPE_LINKS != "off" and others:
+            dedupe_paths([path] + others, known)
+
+# ——— Deduplication —————————————————————————————————————————————————————
+# Copies of an episode are matched by a hash of the audio payload (the bytes
+# between a leading ID3v2 and a trailing ID3v1 tag), so a plain MP3 and its
+# _cover twin count as the same audio. Byte-identical files become reflinks
+# (copy-on-write clones on btrfs/XFS/APFS-style filesystems) or, with
+# DEDUPE_LINKS = "hardlink", hardlinks where cloning isn't supported. Files
+# whose tags differ can only share their audio blocks via a range clone.
+DEDUPE_LINKS = "reflink"        # "reflink", "hardlink" or "off"
+DEDUPE_EXTS = (".mp3", ".m4a")
+FICLONE = 0x40049409            # _IOW(0x94, 9, int)
+FICLONERANGE = 0x4020940D       # _IOW(0x94, 13, struct file_clone_range)
+
+def audio_payload_range(path):
+    size = os.path.getsize(path)
+    start, end = 0, size
+    if not path.lower().endswith(".mp3"):
+        return start, end
+    with open(path, "rb") as f:
+        head = f.read(10)
+        if len(head) == 10 and head[:3] == b"ID3":
+            n = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | head[9] & 0x7F
+            start = min(size, 10 + n + (10 if head[5] & 0x10 else 0))
+        if end - start >= 128:
+            f.seek(end - 128)
+            if f.read(3) == b"TAG":
+                end -= 128
+    return start, end
+
+def content_hashes(path):
+    # One read for (sha256 of the file, sha256 of the audio payload).
+    start, end = audio_payload_range(path)
+    whole, audio = hashlib.sha256(), hashlib.sha256()
+    pos = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            whole.update(chunk)
+            lo, hi = max(start - pos, 0), min(end - pos, len(chunk))
+            if lo < hi:
+                audio.update(chunk[lo:hi])
+            pos += len(chunk)
+    return whole.hexdigest(), audio.hexdigest()
+
+def reflink(src, dst):
+    # Raises OSError where the platform or filesystem can't clone.
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def clone_file(src, dst):
+    try:
+        reflink(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def share_audio_blocks(keeper, dup):
+    # Clones the block-aligned part of the audio payload from keeper into dup.
+    # Only possible when the payload sits at the same block offset in both.
+    # Returns the number of bytes now shared.
+    if fcntl is None:
+        return 0
+    (ks, ke), (ds, de) = audio_payload_range(keeper), audio_payload_range(dup)
+    block = os.stat(dup).st_blksize or 4096
+    if ke - ks != de - ds or (ks - ds) % block:
+        return 0
+    skip = -ks % block
+    length = (ke - ks - skip) // block * block
+    if length <= 0:
+        return 0
+    try:
+        with open(keeper, "rb") as s, open(dup, "r+b") as d:
+            fcntl.ioctl(d.fileno(), FICLONERANGE,
+                        struct.pack("qQQQ", s.fileno(), ks + skip, length, ds + skip))
+    except OSError:
+        return 0
+    return length
+
+def link_duplicate(keeper, dup):
+    # Replaces dup with a reflink (or hardlink) of keeper; returns how or None.
+    tmp = dup + ".dedupe"
+    try:
+        try:
+            reflink(keeper, tmp)
+            how = "reflink"
+        except OSError:
+            remove_temp_files([tmp])
+            if DEDUPE_LINKS != "hardlink":
+                return None
+            os.link(keeper, tmp)
+            how = "hardlink"
+        os.replace(tmp, dup)
+    except OSError:
+        remove_temp_files([tmp])
+        return None
+    return how
+
+def dedupe_paths(paths, known=None):
+    # Groups paths by audio hash and collapses each group onto its oldest
+    # file. `known` maps absolute paths to content_hashes() results already
+    # computed for the current bytes. Returns (bytes_saved,
+    # [(keeper, dup, identical), ...] left unshared).
+    known = known or {}
+    stats = {}
+    for path in dict.fromkeys(os.path.abspath(p) for p in paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        inode = (st.st_dev, st.st_ino)
+        if inode not in stats:
+            stats[inode] = (path, st)
+
+    by_len = {}
+    for path, st in stats.values():
+        start, end = audio_payload_range(path)
+        by_len.setdefault((os.path.splitext(path)[1].lower(), end - start), []).append((path, st))
+
+    groups = {}
+    for candidates in by_len.values():
+        if len(candidates) < 2:
+            continue
+        for path, st in candidates:
+            whole, audio = known.get(path) or content_hashes(path)
+            groups.setdefault(audio, []).append((st.st_mtime, path, st, whole))
+
+    saved, unshared = 0, []
+    for members in groups.values():
+        members.sort()
+        _, keeper, kst, kwhole = members[0]
+        for _, dup, st, whole in members[1:]:
+            if st.st_dev != kst.st_dev:
+                unshared.append((keeper, dup, whole == kwhole))
+                continue
+            if whole == kwhole:
+                how = link_duplicate(keeper, dup)
+                shared = st.st_size if how else 0
+            else:
+                shared = share_audio_blocks(keeper, dup)
+                how = "shared audio" if shared else None
+            if not how:
+                unshared.append((keeper, dup, whole == kwhole))
+                continue
+            saved += shared
+            print_success(f"Deduplicated {dup} ({how} of {os.path.basename(keeper)})")
+    return saved, unshared
+
+def dedupe_library(root):
+    paths = []
+    for folder, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d != STAGING_DIR]
+        paths += [os.path.join(folder, name) for name in names if name.lower().endswith(DEDUPE_EXTS)]
+    print_info(f"Checking {len(paths)} audio files in {root} for duplicates...")
+    saved, unshared = dedupe_paths(paths)
+    print_info(f"Reclaimed {saved / 1024 / 1024:.1f} MB.")
+    if unshared:
+        print_info(f"Same audio as another file, but not linked ({len(unshared)}):")
+        for keeper, dup, identical in unshared:
+            kind = "identical to" if identical else "same audio as"
+            print(Fore.YELLOW + f"  {dup}  ({kind} {keeper})", file=LOG_STREAM)
+        if DEDUPE_LINKS != "hardlink" and any(identical for _, _, identical in unshared):
+            print_info("Identical files can be hardlinked with --dedupe-links hardlink.")
+
+# ——— Link Expiry ———————————————————————————————————————————————————————
+# Pasted links are signed and stop working after a while. link_deadline reads
+# the expiry from the usual places (Expires= / exp= epochs, AWS SigV4 and
+# Google X-Goog-Date + *-Expires, CloudFront policies, Akamai tokens, JWT
+# `exp` in the query or a Bearer header). Batches run earliest deadline
+# first, and a job whose link will expire before a download of typical size
+# could finish at the observed speed fails up front instead of partway.
+JWT_RE = re.compile(r"^[A-Za-z0-9_-]+\.([A-Za-z0-9_-]+)\.[A-Za-z0-9_-]*$")
+
+def _b64_json(data, altchars=None):
+    data = data.translate(altchars) if altchars else data
+    try:
+        return json.loads(base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)))
+    except (ValueError, TypeError):
+        return None
+
+def _epoch(value):
+    if not str(value).isdigit():
+        return None
+    value = int(value)
+    if value > 10 ** 11:    # milliseconds
+        value //= 1000
+    return value if value > 10 ** 9 else None
+
+def _amz_time(value):
+    try:
+        return calendar.timegm(time.strptime(value, "%Y%m%dT%H%M%SZ"))
+    except (TypeError, ValueError):
+        return None
+
+def _jwt_exp(token):
+    m = JWT_RE.match(token or "")
+    claims = _b64_json(m.group(1)) if m else None
+    return _epoch(claims.get("exp")) if isinstance(claims, dict) else None
+
+def link_deadline(url, hdrs=()):
+    # Earliest expiry (epoch seconds) hinted by the URL or headers, or None.
+    query = {k.lower(): v[-1] for k, v in parse_qs(urlsplit(url).query, keep_blank_values=True).items()}
+    found = [_epoch(query.get(k)) for k in ("expires", "exp", "expiry", "expiration")]
+    for prefix in ("x-amz", "x-goog"):
+        start = _amz_time(query.get(f"{prefix}-date"))
+        if start and query.get(f"{prefix}-expires", "").isdigit():
+            found.append(start + int(query[f"{prefix}-expires"]))
+    if query.get("policy"):
+        # CloudFront custom policy: base64 with -_~ standing in for +=/.
+        policy = _b64_json(query["policy"], str.maketrans("-_~", "+=/"))
+        for st in (policy or {}).get("Statement", []):
+            found.append(_epoch(st.get("Condition", {}).get("DateLessThan", {}).get("AWS:EpochTime")))
+    for value in query.values():
+        m = re.search(r"(?:^|~)exp=(\d+)", value)
+        found += [_epoch(m.group(1)) if m else None, _jwt_exp(value)]
+    for name, value in map(split_header, hdrs):
+        if name.lower() == "authorization" and value.lower().startswith("bearer "):
+            found.append(_jwt_exp(value[7:].strip()))
+    found = [t for t in found if t]
+    return min(found) if found else None
+
+def describe_span(secs):
+    secs = abs(secs)
+    return f"{secs / 60:.0f} min" if secs >= 180 else f"{secs:.0f} s"
+
+def describe_deadline(deadline, now=None):
+    left = deadline - (now or time.time())
+    span = describe_span(left)
+    return f"expires in {span}" if left > 0 else f"expired {span} ago"
+
+class ThroughputMeter:
+    # Moving averages of episode download speed and size, kept in the cache
+    # dir so the first batch of a session already has an estimate.
+    def __init__(self, path, alpha=0.3):
+        self.path = path
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+
+    def add(self, nbytes, secs):
+        if nbytes <= 0 or secs <= 0:
+            return
+        with self._lock:
+            for key, value in (("bytes_per_sec", nbytes / secs), ("episode_bytes", nbytes)):
+                old = self._state.get(key)
+                self._state[key] = value if old is None else old + self.alpha * (value - old)
+            try:
+                with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(self._state, f)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError:
+                pass
+
+    def estimate_secs(self):
+        # Seconds for a typical episode, or None before the first download.
+        with self._lock:
+            rate = self._state.get("bytes_per_sec")
+            size = self._state.get("episode_bytes")
+        return size / rate if rate and size else None
+
+_meter = None
+_meter_lock = threading.Lock()
+
+def get_meter():
+    global _meter
+    with _meter_lock:
+        if _meter is None:
+            _meter = ThroughputMeter(os.path.join(cache_dir(), "throughput.json"))
+    return _meter
+
+def deadline_problem(deadline, start_in=0.0):
+    # Why a job with this deadline, starting `start_in` seconds from now,
+    # won't finish in time, or None.
+    if not deadline:
+        return None
+    now = time.time()
+    if deadline <= now:
+        return f"link {describe_deadline(deadline, now)}"
+    need = get_meter().estimate_secs()
+    if need and now + start_in + need > deadline:
+        return f"link {describe_deadline(deadline, now)} but a download takes about {describe_span(need)}"
+    return None
+
+def schedule_jobs(jobs, workers=1):
+    # Earliest deadline first (jobs without one keep their order, last) and
+    # warns about jobs expected to miss their deadline in that order.
+    for job in jobs:
+        job["deadline"] = link_deadline(job["url"], job["headers"])
+    jobs = sorted(jobs, key=lambda j: (j["deadline"] is None, j["deadline"] or 0))
+    need = get_meter().estimate_secs() or 0.0
+    for i, job in enumerate(jobs):
+        problem = deadline_problem(job["deadline"], start_in=(i // max(1, workers)) * need)
+        if problem:
+            print_error(f"{job_name(job)}: {problem}; refresh its cURL.")
+    return jobs
+
+# ——— Session Store —————————————————————————————————————————————————————
+# The headers and cookies of every pasted cURL are kept per host, so later
+# jobs for that host can be a bare URL. Cookies are refreshed from
+# Set-Cookie responses seen by the built-in HTTP transport and dropped once
+# they expire. On Windows the file is encrypted for the current user with
+# DPAPI; elsewhere it is plain JSON readable only by its owner (0600).
+SESSIONS_ENABLED = True
+SESSION_SKIP_HEADERS = {"range", "host", "cookie", "content-length", "accept-encoding",
+                        "if-range", "if-none-match", "if-modified-since"}
+_sessions = None
+_sessions_lock = threading.Lock()
+
+def _dpapi(data, protect):
+    import ctypes
+    from ctypes import wintypes
+
+    class DataBlob(ctypes.Structure):
+        _fields_ = [("cbData", wintypes.DWORD), ("pbData", ctypes.POINTER(ctypes.c_char))]
+
+    buf = ctypes.create_string_buffer(data, len(data))
+    blob_in = DataBlob(len(data), ctypes.cast(buf, ctypes.POINTER(ctypes.c_char)))
+    blob_out = DataBlob()
+    crypt32 = ctypes.windll.crypt32
+    if protect:
+        ok = crypt32.CryptProtectData(ctypes.byref(blob_in), ctypes.c_wchar_p("AIOD sessions"),
+                                      None, None, None, 0x1, ctypes.byref(blob_out))
+    else:
+        ok = crypt32.CryptUnprotectData(ctypes.byref(blob_in), None, None, None, None, 0x1,
+                                        ctypes.byref(blob_out))
+    if not ok:
+        raise ctypes.WinError()
+    try:
+        return ctypes.string_at(blob_out.pbData, blob_out.cbData)
+    finally:
+        ctypes.windll.kernel32.LocalFree(blob_out.pbData)
+
+def cookie_pairs(cookie):
+    pairs = []
+    for part in (cookie or "").split(";"):
+        name, sep, value = part.strip().partition("=")
+        if sep and name:
+            pairs.append((name, value))
+    return pairs
+
+class SessionStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hosts = {}          # host -> {"headers": [...], "updated": epoch}
+        self.cookies = []        # {"name", "value", "domain", "path", "expires", "host_only"}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if os.name == "nt":
+                data = _dpapi(data, protect=False)
+            state = json.loads(data.decode("utf-8"))
+            self.hosts, self.cookies = state["hosts"], state["cookies"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print_error(f"Ignoring unreadable saved sessions: {e}")
+
+    def _save(self):
+        now = time.time()
+        self.cookies = [c for c in self.cookies if not c["expires"] or c["expires"] > now]
+        data = json.dumps({"hosts": self.hosts, "cookies": self.cookies}).encode("utf-8")
+        if os.name == "nt":
+            data = _dpapi(data, protect=True)
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def _set_cookie(self, name, value, domain, path="/", expires=None, host_only=True):
+        self.cookies = [c for c in self.cookies
+                        if (c["name"], c["domain"], c["path"]) != (name, domain, path)]
+        if expires is None or expires > time.time():
+            self.cookies.append({"name": name, "value": value, "domain": domain, "path": path,
+                                 "expires": expires, "host_only": host_only})
+
+    def remember(self, url, hdrs, cookie=None):
+        # Saves a pasted cURL's headers and cookies for its host.
+        host = urlsplit(url).hostname or ""
+        kept = []
+        for h in hdrs:
+            name, value = split_header(h)
+            if name.lower() == "cookie":
+                cookie = "; ".join(filter(None, [cookie, value]))
+            elif name.lower() not in SESSION_SKIP_HEADERS:
+                kept.append(h)
+        with self._lock:
+            self.hosts[host] = {"headers": kept, "updated": int(time.time())}
+            for name, value in cookie_pairs(cookie):
+                self._set_cookie(name, value, host)
+            self._save()
+
+    def absorb(self, url, set_cookies):
+        # Applies Set-Cookie header values from a response to `url`.
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        changed = False
+        with self._lock:
+            for header in set_cookies:
+                jar = SimpleCookie()
+                try:
+                    jar.load(header)
+                except CookieError:
+                    continue
+                for morsel in jar.values():
+                    domain = morsel["domain"].lstrip(".").lower()
+                    if domain and not (host == domain or host.endswith("." + domain)):
+                        continue
+                    expires = None
+                    if morsel["max-age"]:
+                        try:
+                            expires = time.time() + int(morsel["max-age"])
+                        except ValueError:
+                            pass
+                    elif morsel["expires"]:
+                        try:
+                            expires = parsedate_to_datetime(morsel["expires"]).timestamp()
+                        except (TypeError, ValueError, IndexError, OverflowError):
+                            pass
+                    path = morsel["path"] or parts.path.rsplit("/", 1)[0] or "/"
+                    self._set_cookie(morsel.key, morsel.value, domain or host, path,
+                                     expires, host_only=not domain)
+                    changed = True
+            if changed:
+                self._save()
+
+    def lookup(self, url):
+        # Returns (headers, cookie) saved for the URL's host, or None.
+        parts = urlsplit(url)
+        host, path = parts.hostname or "", parts.path or "/"
+        now = time.time()
+        with self._lock:
+            saved = self.hosts.get(host)
+            cookies = [
+                f"{c['name']}={c['value']}" for c in self.cookies
+                if (not c["expires"] or c["expires"] > now)
+                and (host == c["domain"] or (not c["host_only"] and host.endswith("." + c["domain"])))
+                and path.startswith(c["path"])
+            ]
+        if saved is None and not cookies:
+            return None
+        return list(saved["headers"]) if saved else [], "; ".join(cookies) or None
+
+def sessions_path():
+    return os.path.join(cache_dir(), "sessions.dpapi" if os.name == "nt" else "sessions.json")
+
+def get_sessions():
+    global _sessions
+    if not SESSIONS_ENABLED:
+        return None
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = SessionStore(sessions_path())
+    return _sessions
+
+def has_credentials(job):
+    return bool(job["cookie"]) or any(
+        not h.lower().startswith("range:") for h in job["headers"]
+    )
+
+def fill_session(job):
+    # Saves a job's headers and cookie for its host, or gives a bare-URL job
+    # the saved ones. Returns True when the job now uses the saved session.
+    store = get_sessions()
+    if not store:
+        return False
+    try:
+        if has_credentials(job):
+            store.remember(job["url"], job["headers"], job["cookie"])
+            return False
+        saved = store.lookup(job["url"])
+    except OSError as e:
+        print_error(f"Could not update saved sessions: {e}")
+        return False
+    if not saved:
+        return False
+    job["headers"] = saved[0] + ["Range: bytes=0-"]
+    job["cookie"] = saved[1]
+    job["session"] = True
+    return True
+
+def refresh_session(job):
+    # Picks up cookies refreshed since the job was queued.
+    store = get_sessions() if job.get("session") else None
+    saved = store.lookup(job["url"]) if store else None
+    if saved and saved[1]:
+        job["cookie"] = saved[1]
+
+# ——— Staging ———————————————————————————————————————————————————————————
+# Episodes are downloaded, converted and tagged in a work folder per episode
+# under base_dir/.aiod-staging, on the same filesystem as the library, and
+# only published once finished: fsynced, then renamed over a name reserved
+# with unique_path. A crash or Ctrl+C leaves nothing half-written in the
+# library. An episode always gets the same work folder, so its .part file
+# resumes on the next run; folders untouched for STAGING_MAX_AGE are removed.
+STAGING_DIR = ".aiod-staging"
+STAGING_MAX_AGE = 7 * 24 * 3600
+_staging_lock = threading.Lock()
+_staging_claims = set()
+_staging_swept = set()
+
+def staging_root(base_dir):
+    root = os.path.join(base_dir, STAGING_DIR)
+    os.makedirs(root, exist_ok=True)
+    with _staging_lock:
+        swept = root in _staging_swept
+        _staging_swept.add(root)
+    if not swept:
+        sweep_staging(root)
+    return root
+
+def sweep_staging(root):
+    cutoff = time.time() - STAGING_MAX_AGE
+    for name in os.listdir(root):
+        work = os.path.join(root, name)
+        try:
+            newest = max([os.path.getmtime(work)] +
+                         [os.path.getmtime(os.path.join(work, f)) for f in os.listdir(work)])
+        except OSError:
+            continue
+        if newest < cutoff:
+            shutil.rmtree(work, ignore_errors=True)
+
+def clear_staging(work):
+    # Drops everything but a resumable download.
+    for name in os.listdir(work):
+        if not name.endswith((".part", ".part.json")):
+            remove_temp_files([os.path.join(work, name)])
+
+def claim_staging(base_dir, url):
+    # Returns the work folder for `url`. A second job for the same episode in
+    # this process gets a fresh folder instead of sharing one.
+    root = staging_root(base_dir)
+    work = os.path.join(root, hashlib.sha256(url_key(url).encode()).hexdigest()[:16])
+    with _staging_lock:
+        if work in _staging_claims:
+            os.makedirs(root, exist_ok=True)
+            work = tempfile.mkdtemp(dir=root)
+        os.makedirs(work, exist_ok=True)
+        _staging_claims.add(work)
+    # Output of a run that stopped before publishing is made again.
+    clear_staging(work)
+    return work
+
+def release_staging(work):
+    # Removes the work folder, and the staging folder once it is empty.
+    with _staging_lock:
+        _staging_claims.discard(work)
+        try:
+            clear_staging(work)
+            os.rmdir(work)
+            os.rmdir(os.path.dirname(work))
+        except OSError:
+            pass
+
+def fsync_path(path):
+    if os.path.isdir(path):
+        if os.name == "nt":
+            return
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def publish(path, base_dir):
+    # Moves a finished file from its work folder into base_dir under the same
+    # name (or name_1, ... when taken) and returns the new path.
+    fsync_path(path)
+    final = unique_path(os.path.join(base_dir, os.path.basename(path)))
+    try:
+        os.replace(path, final)
+    except OSError:
+        remove_temp_files([final])
+        raise
+    fsync_path(base_dir)
+    return final
+
+# ——— Core Download Flow —————————————————————————————————————————————
+def parse_curl(raw):
+    raw = raw.replace("^", "")
+    m = re.search(r'(https?://[^\s"\'\\]+)', raw)
+    if not m:
+        return None
+    url = m.group(1)
 
     hdrs = [
         h.replace("\\", "")
@@ -271,76 +2944,570 @@ def run_download(base_dir, embed_cover, keep_original=False):
         if not h.lower().startswith("range:")
     ]
     hdrs.append("Range: bytes=0-")
-    cookie = parse_cookie(raw)
+    return {"url": url, "headers": hdrs, "cookie": parse_cookie(raw)}
+
+DOWNLOAD_SEGMENTS = 4
+
+def download_failure(e):
+    # User-facing message for a StubResponseError or DownloadFailed.
+    if isinstance(e, StubResponseError):
+        return f"Not audio ({e}). Token may be expired. Paste a fresh cURL and try again."
+    if e.kind in ("auth", "client"):
+        return f"Download refused ({e}). Token may be expired. Paste a fresh cURL and try again."
+    return f"Download failed ({e})."
 
+def download_episode(work, url, hdrs, cookie=None, show_progress=True, cover=None):
+    # Network half of fetch_episode, into the work folder from claim_staging.
+    # Returns (path, error, cover_embedded); in --stream mode the path may
+    # already be the finished MP3.
     fname = sanitize_filename(os.path.basename(url.split("?", 1)[0]))
-    out_path = unique_path(os.path.join(base_dir, fname))
-
-    print_info("Downloading episode...")
-    cmd = ["curl", "-#", "-L", "-f", url]
-    for h in hdrs:
-        cmd += ["-H", h]
-    if cookie:
-        cmd += ["-b", cookie]
-    cmd += ["-o", out_path]
-    ok = run_with_retries(cmd, attempts=3, cwd=base_dir)
-    if not ok:
-        print_error("Download failed. Token may be expired. Paste a fresh cURL and try again.")
-        return
+    out_path = os.path.join(work, fname)
 
-    size = os.path.getsize(out_path) if os.path.exists(out_path) else 0
-    if size < 50_000:
-        print_error("File too small; probably an HTML stub.")
+    # Streamed MP3s get their cover from mutagen, so without it they can't.
+    if (STREAM_TRANSCODE and OUTPUT_POLICY == "mp3" and not out_path.lower().endswith(".mp3")
+            and (cover is None or ID3 is not None)):
+        mp3_path = os.path.splitext(out_path)[0] + ".mp3"
+        mp3_path = cover_path_for(mp3_path) if cover else mp3_path
+        with stage("stream") as st:
+            streamed = stream_to_mp3(url, hdrs, mp3_path, cookie=cookie,
+                                     show_progress=show_progress, cover=cover)
+            st.ok = bool(streamed)
+            st.bytes = os.path.getsize(mp3_path) if streamed else None
+        if streamed:
+            return mp3_path, None, cover is not None
+        print_info("Source can't be streamed; downloading it first.")
+
+    print_info(f"Downloading episode: {fname}")
+    started = time.monotonic()
+    with stage("download") as st:
+        try:
+            download_with_headers(url, out_path, hdrs, cookie=cookie, show_progress=show_progress,
+                                  segments=DOWNLOAD_SEGMENTS, resume=True, sniff=True)
+        except (StubResponseError, DownloadFailed) as e:
+            st.ok = False
+            return None, download_failure(e), False
+        size = os.path.getsize(out_path) if os.path.exists(out_path) else 0
+        st.bytes = size
+    if size >= MIN_EPISODE_BYTES:
+        get_meter().add(size, time.monotonic() - started)
+    if size < MIN_EPISODE_BYTES:
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        return None, "File too small; probably an HTML stub.", False
+    try:
+        has_audio = probe_media(out_path)["codec"] is not None
+    except (subprocess.CalledProcessError, OSError):
+        has_audio = False
+    if not has_audio:
         try:
             os.remove(out_path)
         except OSError:
             pass
+        return None, "Download has no audio stream; probably an HTML error page.", False
+    return out_path, None, False
+
+def convert_episode(path, show_progress=True, cover=None):
+    # CPU half of fetch_episode. Returns (out_path, error, cover_embedded).
+    if not path.lower().endswith(".mp3"):
+        converted = convert_audio(path, show_progress=show_progress, cover=cover)
+        if not converted:
+            return None, f"ffmpeg failed to convert '{path}'.", False
+        if converted != path:
+            return converted, None, cover is not None
+    return path, None, False
+
+def fetch_episode(work, url, hdrs, cookie=None, show_progress=True, cover=None):
+    # Returns (out_path, error, cover_embedded), with out_path still in the
+    # work folder. A prepared `cover` is attached in the conversion pass when
+    # there is one; otherwise it is left to the caller and cover_embedded is
+    # False.
+    path, err, embedded = download_episode(
+        work, url, hdrs, cookie=cookie, show_progress=show_progress, cover=cover
+    )
+    if not path or embedded:
+        return path, err, embedded
+    return convert_episode(path, show_progress=show_progress, cover=cover)
+
+def run_download(base_dir, embed_cover, keep_original=False):
+    print_info("\nPaste your cURL (Windows) and press Enter twice. 'q' to quit.")
+    lines = []
+    while True:
+        line = input()
+        if not line.strip():
+            break
+        if line.strip().lower() == "q":
+            print_info("Exiting.")
+            sys.exit(0)
+        lines.append(line)
+
+    job = parse_curl(" ".join(lines))
+    if not job:
+        print_error("No URL found.")
         return
+    if fill_session(job):
+        print_info(f"Using the saved session for {urlsplit(job['url']).hostname}.")
+    hdrs, cookie = job["headers"], job["cookie"]
+    set_episode(job_name(job))
 
-    if not out_path.lower().endswith(".mp3"):
-        mp3 = convert_to_mp3(out_path)
-        if not mp3:
-            return
-        out_path = mp3
+    found = find_downloaded(base_dir, job["url"])
+    if found:
+        verb = "Already downloaded" if found[1] == "exists" else "Linked earlier download"
+        print_success(f"{verb}: {found[0]} (use --redownload to fetch it again)")
+        return
 
-    print_success(f"MP3 ready: {out_path}")
+    deadline = link_deadline(job["url"], hdrs)
+    problem = deadline_problem(deadline)
+    if problem:
+        print_error(f"The {problem}. Paste a fresh cURL and try again.")
+        return
+    if deadline:
+        print_info(f"Link {describe_deadline(deadline)}.")
 
+    # The cover is fetched up front so it can be attached during conversion.
+    cover = None
     if embed_cover == "y":
         img_url = input(Fore.YELLOW + "Cover URL (blank to skip): ").strip()
         if img_url:
-            new_path = process_and_embed_image(
-                out_path, img_url, hdrs, cookie=cookie, keep_original=keep_original
-            )
+            cover = fetch_cover(img_url, hdrs, cookie=cookie)
+            if not cover:
+                print_error("Embedding cover failed.")
+        else:
+            print_info("Skipping cover embedding.")
+
+    work = claim_staging(base_dir, job["url"])
+    try:
+        out_path, err, embedded = fetch_episode(
+            work, job["url"], hdrs, cookie, cover=None if keep_original else cover
+        )
+        if not out_path:
+            print_error(err)
+            return
+        kind = os.path.splitext(out_path)[1].lstrip(".").upper()
+        related = []
+        if cover and not embedded:
+            new_path = embed_cover_art(out_path, cover, keep_original=keep_original)
             if new_path:
-                print_success(f"Cover embedded: {new_path}")
+                if keep_original:
+                    related.append(publish(out_path, base_dir))
+                    print_success(f"{kind} ready: {related[0]}")
+                out_path, embedded = new_path, True
             else:
                 print_error("Embedding cover failed.")
+        out_path = publish(out_path, base_dir)
+    except OSError as e:
+        print_error(f"Could not save {job_name(job)}: {e}")
+        return
+    finally:
+        release_staging(work)
+    print_success(f"Cover embedded: {out_path}" if embedded else f"{kind} ready: {out_path}")
+    record_download(job["url"], out_path, related=related)
+
+# ——— Batch Mode ————————————————————————————————————————————————————
+def load_batch_jobs(path):
+    # Jobs are separated by blank lines. A block is either a pasted cURL or a
+    # bare URL, which reuses the headers and cookie of the last cURL above it
+    # (or the saved session for its host when there is none).
+    # An optional "cover: <url>" line inside a block sets that job's cover.
+    with open(path, encoding="utf-8") as f:
+        blocks = re.split(r"\n\s*\n", f.read())
+
+    jobs = []
+    shared = {"headers": ["Range: bytes=0-"], "cookie": None}
+    for block in blocks:
+        lines = [l for l in block.splitlines() if l.strip() and not l.lstrip().startswith("#")]
+        cover_url = None
+        for l in list(lines):
+            if l.strip().lower().startswith("cover:"):
+                cover_url = l.split(":", 1)[1].strip() or None
+                lines.remove(l)
+        if not lines:
+            continue
+        raw = " ".join(lines)
+        job = parse_curl(raw)
+        if not job:
+            print_error(f"No URL found in batch entry: {raw[:60]}")
+            continue
+        if re.match(r"\s*curl\b", raw):
+            shared = {"headers": job["headers"], "cookie": job["cookie"]}
+            fill_session(job)
         else:
-            print_info("Skipping cover embedding.")
+            job["headers"], job["cookie"] = list(shared["headers"]), shared["cookie"]
+            if not has_credentials(job):
+                fill_session(job)
+        job["cover_url"] = cover_url
+        jobs.append(job)
+    return jobs
+
+def job_name(job):
+    return os.path.basename(job["url"].split("?", 1)[0])
+
+def download_stage(base_dir, job, embed_cover, keep_original=False):
+    # Network half of a batch job (cover + episode bytes). Returns the state
+    # for convert_stage, or a finished result dict when the download failed.
+    name = job_name(job)
+    set_episode(name)
+    row = job_row(job)
+    found = find_downloaded(base_dir, job["url"])
+    if found:
+        return {"name": name, "ok": True, "path": found[0], "error": None, "skipped": True}
+    # Re-checked at start: earlier jobs may have run slower than estimated.
+    problem = deadline_problem(job.get("deadline"))
+    if problem:
+        return {"name": name, "ok": False, "path": None,
+                "error": f"Skipped: {problem}. Paste a fresh cURL and try again."}
+
+    refresh_session(job)
+    cover, cover_failed = None, False
+    if embed_cover == "y" and job.get("cover_url"):
+        cover = fetch_cover(job["cover_url"], job["headers"], cookie=job["cookie"])
+        cover_failed = cover is None
+
+    work = claim_staging(base_dir, job["url"])
+    try:
+        path, err, embedded = download_episode(
+            work, job["url"], job["headers"], job["cookie"], show_progress=False,
+            cover=None if keep_original else cover
+        )
+    except BaseException:
+        release_staging(work)
+        raise
+    if not path:
+        release_staging(work)
+        return {"name": name, "ok": False, "path": None, "error": err}
+    if row:
+        row.begin("waiting")
+    return {"name": name, "url": job["url"], "path": path, "embedded": embedded,
+            "cover": cover, "cover_failed": cover_failed, "row": row,
+            "base_dir": base_dir, "work": work}
+
+def convert_stage(staged, keep_original=False):
+    name, cover = staged["name"], staged["cover"]
+    set_episode(name)
+    _row_var.set(staged["row"])
+    related = []
+    try:
+        out_path, embedded = staged["path"], staged["embedded"]
+        if not embedded:
+            out_path, err, embedded = convert_episode(
+                out_path, show_progress=False, cover=None if keep_original else cover
+            )
+            if not out_path:
+                return {"name": name, "ok": False, "path": None, "error": err}
+
+        if cover and not embedded:
+            new_path = embed_cover_art(out_path, cover, keep_original=keep_original)
+            if not new_path:
+                return {"name": name, "ok": False, "path": publish(out_path, staged["base_dir"]),
+                        "error": "Embedding cover failed."}
+            if keep_original:
+                related.append(publish(out_path, staged["base_dir"]))
+            out_path = new_path
+        out_path = publish(out_path, staged["base_dir"])
+    finally:
+        release_staging(staged["work"])
+
+    record_download(staged["url"], out_path, related=related)
+    if staged["cover_failed"]:
+        return {"name": name, "ok": False, "path": out_path, "error": "Cover download failed."}
+    return {"name": name, "ok": True, "path": out_path, "error": None}
+
+CPU_WORKERS = os.cpu_count() or 1
+
+def run_batch(base_dir, jobs, embed_cover, keep_original=False, workers=4, cpu_workers=None,
+              on_result=None):
+    # Two-stage pipeline: `workers` threads download while `cpu_workers`
+    # threads drive conversions. The encode runs in the ffmpeg child process,
+    # so a thread per core keeps every core busy without pickling jobs into a
+    # process pool. At most 2 * cpu_workers downloaded episodes wait for a
+    # conversion slot; past that, download workers block until one frees up.
+    # `on_result(job, result)` is called from this thread as jobs finish.
+    cpu_workers = max(1, cpu_workers or CPU_WORKERS)
+    seen, unique, results = set(), [], []
+    for job in jobs:
+        if url_key(job["url"]) not in seen:
+            seen.add(url_key(job["url"]))
+            unique.append(job)
+            continue
+        res = {"name": job_name(job), "ok": True, "path": None, "error": None, "skipped": True}
+        if on_result:
+            on_result(job, res)
+        results.append(res)
+    if results:
+        print_info(f"Skipping {len(results)} duplicate entries.")
+    jobs = schedule_jobs(unique, workers)
+    print_info(f"Running {len(jobs)} downloads with {workers} download workers "
+               f"and {cpu_workers} conversion workers...")
+    pending = threading.BoundedSemaphore(cpu_workers * 2)
+    done = queue.Queue()
+    previous_hook = start_dashboard(len(jobs)) if DASHBOARD_ENABLED and jobs else LOG_HOOK
+
+    def failure(job, e):
+        return {"name": job_name(job), "ok": False, "path": None, "error": str(e)}
+
+    def convert(job, staged):
+        try:
+            done.put((job, convert_stage(staged, keep_original=keep_original)))
+        except Exception as e:
+            done.put((job, failure(job, e)))
+        finally:
+            pending.release()
+
+    def download(job):
+        try:
+            staged = download_stage(base_dir, job, embed_cover, keep_original=keep_original)
+        except Exception as e:
+            done.put((job, failure(job, e)))
+            return
+        if "ok" in staged:
+            done.put((job, staged))
+            return
+        pending.acquire()
+        cpu_pool.submit(convert, job, staged)
+
+    try:
+        with ThreadPoolExecutor(max_workers=cpu_workers) as cpu_pool, \
+                ThreadPoolExecutor(max_workers=max(1, workers)) as net_pool:
+            for job in jobs:
+                net_pool.submit(download, job)
+            for _ in jobs:
+                job, res = done.get()
+                if DASHBOARD:
+                    DASHBOARD.finish(id(job), res["ok"])
+                if res["ok"]:
+                    print_success(f"{res['name']} -> {res['path']}")
+                else:
+                    print_error(f"{res['name']}: {res['error']}")
+                if on_result:
+                    on_result(job, res)
+                results.append(res)
+    finally:
+        stop_dashboard(previous_hook)
+    return results
+
+def print_batch_summary(results):
+    ok = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    print(file=LOG_STREAM)
+    skipped = sum(1 for r in ok if r.get("skipped"))
+    note = f" ({skipped} already downloaded)" if skipped else ""
+    print_info(f"Batch summary: {len(ok)} succeeded{note}, {len(failed)} failed.")
+    for r in ok:
+        tag = "SKIP" if r.get("skipped") else "OK  "
+        print(Fore.GREEN + f"  {tag}  {r['name']} -> {r['path'] or 'duplicate entry'}", file=LOG_STREAM)
+    for r in failed:
+        print(Fore.RED + f"  FAIL  {r['name']}: {r['error']}", file=LOG_STREAM)
+
+def normalize_job(entry):
+    # Job dict from a --jobs line (or an aiod caller); raises ValueError,
+    # KeyError or TypeError when it is unusable.
+    url = entry["url"]
+    if not isinstance(url, str) or not re.match(r"https?://", url):
+        raise ValueError("url must be an http(s) URL")
+    hdrs = entry.get("headers") or []
+    if isinstance(hdrs, dict):
+        hdrs = [f"{k}: {v}" for k, v in hdrs.items()]
+    hdrs = [h for h in hdrs if not h.lower().startswith("range:")] + ["Range: bytes=0-"]
+    return {"id": entry.get("id"), "url": url, "headers": hdrs,
+            "cookie": entry.get("cookie"), "cover_url": entry.get("cover_url")}
+
+def load_json_jobs(path):
+    # One JSON object per line: {"url", "headers", "cookie", "cover_url"},
+    # plus an optional "id" echoed back in the result. Headers may be a list
+    # of "Name: value" strings or an object. "-" reads stdin. Returns
+    # (jobs, errors) where errors are result dicts for unusable lines.
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    jobs, errors = [], []
+    try:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                jobs.append(normalize_job(json.loads(line)))
+                fill_session(jobs[-1])
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append({"line": n, "ok": False, "path": None,
+                               "error": f"Bad job line: {e}"})
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return jobs, errors
+
+def result_record(job, res):
+    record = {
+        "id": job.get("id") if job else None,
+        "url": url_key(job["url"]) if job else None,
+        "name": res.get("name"),
+        "ok": res["ok"],
+        "skipped": bool(res.get("skipped")),
+        "path": res["path"],
+        "error": res["error"],
+    }
+    if "line" in res:
+        record["line"] = res["line"]
+    return record
+
+def emit_result(job, res):
+    sys.stdout.write(json.dumps(result_record(job, res)) + "\n")
+    sys.stdout.flush()
 
 # ——— Main Loop ———————————————————————————————————————————————
 if __name__ == "__main__":
-    print_banner()
+    colorama_init(autoreset=True)
+
+    parser = argparse.ArgumentParser(description="Adventures in Odyssey episode downloader")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="file of cURL commands / URLs separated by blank lines")
+    parser.add_argument("--jobs", metavar="FILE",
+                        help="run unattended: JSON-lines jobs (url/headers/cookie/cover_url) "
+                             "from FILE or - for stdin; JSON-lines results go to stdout")
+    parser.add_argument("--out", metavar="DIR",
+                        help="download dir (skips the prompt)")
+    parser.add_argument("--cover", choices=("embed", "skip"),
+                        help="embed cover art or not (skips the prompt; default with --jobs: embed)")
+    parser.add_argument("--keep-original", action="store_true", default=None,
+                        help="keep the plain MP3 next to the cover-embedded copy")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="concurrent downloads in batch mode (default: 4)")
+    parser.add_argument("--cpu-workers", type=int, default=CPU_WORKERS,
+                        help=f"concurrent conversions in batch mode (default: {CPU_WORKERS}, one per core)")
+    parser.add_argument("--transport", choices=("http", "curl"), default=TRANSPORT.name,
+                        help="download backend: pooled in-process HTTP or one curl per request")
+    parser.add_argument("--segments", type=int, default=DOWNLOAD_SEGMENTS,
+                        help="parallel byte-range connections per episode (default: 4, 1 disables)")
+    parser.add_argument("--stream", action="store_true",
+                        help="pipe non-MP3 downloads straight into ffmpeg instead of saving them first")
+    parser.add_argument("--parallel-encode", type=int, nargs="?", metavar="N",
+                        const=os.cpu_count() or 1, default=PARALLEL_ENCODE,
+                        help="encode episodes longer than 20 minutes as N chunks in parallel "
+                             "(default N: one per core; 0 = single ffmpeg process)")
+    parser.add_argument("--output", choices=("mp3", "native"), default=OUTPUT_POLICY,
+                        help="mp3: always produce MP3 (stream-copied when the source is already "
+                             "MP3); native: keep AAC sources as M4A without re-encoding")
+    parser.add_argument("--tag-writer", choices=("mutagen", "ffmpeg"), default=TAG_WRITER,
+                        help="how covers are added to existing MP3s: edit the ID3 tag in place "
+                             "(mutagen) or remux the whole file (ffmpeg)")
+    parser.add_argument("--redownload", action="store_true",
+                        help="download episodes again even if the manifest says they are already saved")
+    parser.add_argument("--dedupe", metavar="DIR",
+                        help="collapse duplicate episodes in DIR into reflinks/hardlinks and exit")
+    parser.add_argument("--dedupe-links", choices=("reflink", "hardlink", "off"), default=DEDUPE_LINKS,
+                        help="how identical files are shared: copy-on-write clones only, clones "
+                             "or hardlinks, or not at all (default: reflink)")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="don't read or update the download manifest")
+    parser.add_argument("--no-session", action="store_true",
+                        help="don't save pasted headers/cookies or reuse them for bare URLs")
+    parser.add_argument("--forget-sessions", action="store_true",
+                        help="delete the saved headers and cookies and exit")
+    parser.add_argument("--no-dashboard", action="store_true",
+                        help="in batch mode, print messages only instead of the live progress dashboard")
+    parser.add_argument("--timings", action="store_true",
+                        help="time every stage of every episode and print p50/p95 per stage at the end")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="append per-stage timings as JSON lines to FILE (implies --timings)")
+    parser.add_argument("--prom", metavar="FILE",
+                        help="write stage metrics in Prometheus text format to FILE (implies --timings)")
+    parser.add_argument("--cover-cache-mb", type=int, default=COVER_CACHE_MB,
+                        help="size cap of the on-disk cover cache in MB (default: 200, 0 disables)")
+    args = parser.parse_args()
+
+    COVER_CACHE_MB = args.cover_cache_mb
+    MANIFEST_ENABLED = not args.no_manifest
+    SESSIONS_ENABLED = not args.no_session
+    REDOWNLOAD = args.redownload
+    DEDUPE_LINKS = args.dedupe_links
+    OUTPUT_POLICY = args.output
+    TAG_WRITER = args.tag_writer if ID3 is not None else "ffmpeg"
+    DOWNLOAD_SEGMENTS = max(1, args.segments)
+    STREAM_TRANSCODE = args.stream
+    PARALLEL_ENCODE = max(0, args.parallel_encode)
+    if args.transport == "curl":
+        ensure_available("curl")
+    set_transport(make_transport(args.transport))
+
+    if args.timings or args.trace or args.prom:
+        try:
+            enable_metrics(expand_path(args.trace) if args.trace else None,
+                           expand_path(args.prom) if args.prom else None)
+        except OSError as e:
+            parser.error(f"can't open trace file: {e}")
+
+    if args.jobs:
+        LOG_STREAM = sys.stderr
+        if not args.out:
+            parser.error("--jobs needs --out DIR")
+        args.cover = args.cover or "embed"
+        args.keep_original = bool(args.keep_original)
+
+    DASHBOARD_ENABLED = not args.no_dashboard and LOG_STREAM.isatty()
+    if not args.jobs:
+        print_banner()
+    if args.forget_sessions:
+        try:
+            os.remove(sessions_path())
+            print_success("Saved sessions deleted.")
+        except FileNotFoundError:
+            print_info("No saved sessions.")
+        sys.exit(0)
+    if args.dedupe:
+        if DEDUPE_LINKS == "off":
+            DEDUPE_LINKS = "reflink"
+        dedupe_library(expand_path(args.dedupe))
+        sys.exit(0)
+    # The maintenance flags above don't need FFmpeg; everything below does.
+    for tool in ("ffmpeg", "ffprobe"):
+        ensure_available(tool)
     base_dir = expand_path(
-        safe_input("Download dir (e.g. ~/Downloads): ", allow_quit=True)
+        args.out or safe_input("Download dir (e.g. ~/Downloads): ", allow_quit=True)
     )
     if not os.path.exists(base_dir):
         os.makedirs(base_dir)
 
-    embed_choice = safe_input(
-        "Embed cover art? (y/n): ",
-        valid=("y", "n"),
-        allow_quit=True
-    )
+    if args.cover:
+        embed_choice = "y" if args.cover == "embed" else "n"
+    else:
+        embed_choice = safe_input(
+            "Embed cover art? (y/n): ",
+            valid=("y", "n"),
+            allow_quit=True
+        )
 
     keep_original_mp3 = False
     if embed_choice == "y":
-        keep_choice = safe_input(
-            "Keep original MP3 after embedding cover? (y/n): ",
-            valid=("y", "n"),
-            allow_quit=True
+        if args.keep_original is not None:
+            keep_original_mp3 = args.keep_original
+        else:
+            keep_choice = safe_input(
+                "Keep original MP3 after embedding cover? (y/n): ",
+                valid=("y", "n"),
+                allow_quit=True
+            )
+            keep_original_mp3 = (keep_choice == "y")
+
+    if args.jobs:
+        json_jobs, bad_lines = load_json_jobs(args.jobs)
+        for res in bad_lines:
+            emit_result(None, res)
+        batch_results = run_batch(
+            base_dir, json_jobs, embed_choice, keep_original=keep_original_mp3,
+            workers=args.workers, cpu_workers=args.cpu_workers, on_result=emit_result
+        ) if json_jobs else []
+        ok = not bad_lines and all(r["ok"] for r in batch_results)
+        sys.exit(0 if ok else 1)
+
+    if args.batch:
+        batch_jobs = load_batch_jobs(expand_path(args.batch))
+        if not batch_jobs:
+            print_error("No jobs found in batch file.")
+            sys.exit(1)
+        batch_results = run_batch(
+            base_dir, batch_jobs, embed_choice, keep_original=keep_original_mp3,
+            workers=args.workers, cpu_workers=args.cpu_workers
         )
-        keep_original_mp3 = (keep_choice == "y")
+        print_batch_summary(batch_results)
+        sys.exit(0 if all(r["ok"] for r in batch_results) else 1)
 
     print_info("You can hit 'q' at any prompt to quit.")
 
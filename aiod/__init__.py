@@ -0,0 +1,34 @@
+# Importable asyncio API for the AIO downloader, built from the V4 script's
+# steps. See "Library API (V4)" in README.md.
+#
+#     import asyncio, aiod
+#     result = asyncio.run(aiod.download_episode(curl_text, "downloads"))
+#
+#     async for event in aiod.run_batch(jobs, "downloads", concurrency=32):
+#         if event["event"] == "finished":
+#             print(event["result"])
+from .aio import (
+    as_job,
+    convert,
+    download_episode,
+    embed,
+    fetch,
+    fetch_bytes,
+    fetch_cover,
+    probe,
+    run_batch,
+    run_tool,
+)
+from .core import v4
+
+parse_curl = v4.parse_curl
+DownloadError = v4.DownloadError
+DownloadFailed = v4.DownloadFailed
+HttpStatusError = v4.HttpStatusError
+StubResponseError = v4.StubResponseError
+
+__all__ = [
+    "DownloadError", "DownloadFailed", "HttpStatusError", "StubResponseError",
+    "as_job", "convert", "download_episode", "embed", "fetch", "fetch_bytes", "fetch_cover",
+    "parse_curl", "probe", "run_batch", "run_tool", "v4",
+]
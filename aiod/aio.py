@@ -0,0 +1,447 @@
+# asyncio versions of the V4 download steps. One event loop drives every
+# job: HTTP goes through asyncio streams and ffmpeg/ffprobe through
+# asyncio.create_subprocess_exec, so hundreds of in-flight jobs cost a task
+# each rather than a thread each. Parsing, the retry policy, conversion
+# planning, the manifest and deadline checks are the V4 functions.
+import asyncio
+import http.client
+import io
+import json
+import logging
+import os
+import ssl
+import subprocess
+from urllib.parse import urljoin, urlsplit
+
+from .core import v4
+
+log = logging.getLogger("aiod")
+_LEVELS = {"error": logging.ERROR, "success": logging.INFO, "info": logging.INFO}
+v4.LOG_HOOK = lambda level, msg: log.log(_LEVELS[level], msg.strip())
+
+TIMEOUT = 30
+MAX_REDIRECTS = 10
+CHUNK_SIZE = 256 * 1024
+_ssl_context = None
+
+# ——— Jobs ——————————————————————————————————————————————————————————————
+def as_job(job):
+    # Accepts a pasted cURL string or a dict in the --jobs format and returns
+    # the normalized job dict. Raises ValueError when there is no usable URL.
+    if isinstance(job, str):
+        parsed = v4.parse_curl(job)
+        if not parsed:
+            raise ValueError("No URL found.")
+        job = parsed
+    try:
+        return v4.normalize_job(job)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Bad job: {e}") from e
+
+def _result(job, ok, path=None, error=None, **extra):
+    return {"name": v4.job_name(job), "ok": ok, "path": path, "error": error, **extra}
+
+# ——— Subprocesses ——————————————————————————————————————————————————————
+async def run_tool(cmd, input=None):
+    # Returns stdout; raises CalledProcessError. `input` is written to the
+    # child's stdin. A cancelled task kills the child instead of leaving it
+    # running.
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        out, err = await proc.communicate(input)
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, out, err)
+    return out
+
+def _ffmpeg(cmd):
+    # V4 builds ffmpeg commands for an interactive console; here ffmpeg must
+    # never wait on stdin for keys (it refuses to overwrite instead of asking).
+    # Inputs read from pipe:0 still work.
+    return [cmd[0], "-nostdin", "-loglevel", "error", *cmd[1:]]
+
+async def probe(path):
+    out = await run_tool(["ffprobe", "-v", "error", "-print_format", "json",
+                          "-show_format", "-show_streams", path])
+    try:
+        return v4.parse_probe_output(json.loads(out.decode() or "{}"))
+    except ValueError:
+        return v4.parse_probe_output({})
+
+# ——— HTTP ——————————————————————————————————————————————————————————————
+async def _read(coro):
+    return await asyncio.wait_for(coro, TIMEOUT)
+
+async def _open(url, hdrs):
+    # One request per connection; returns (reader, writer, status, headers).
+    global _ssl_context
+    parts = urlsplit(url)
+    tls = parts.scheme.lower() == "https"
+    if tls and _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    reader, writer = await _read(asyncio.open_connection(
+        parts.hostname, parts.port or (443 if tls else 80), ssl=_ssl_context if tls else None
+    ))
+    try:
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        lines = [f"GET {target} HTTP/1.1"]
+        names = {v4.split_header(h)[0].lower() for h in hdrs}
+        if "host" not in names:
+            lines.append(f"Host: {parts.netloc}")
+        for h in hdrs:
+            name, value = v4.split_header(h)
+            # Bodies are written to disk as-is, so never ask for compression.
+            if name.lower() not in ("accept-encoding", "connection"):
+                lines.append(f"{name}: {value}")
+        lines += ["Accept-Encoding: identity", "Connection: close", "", ""]
+        writer.write("\r\n".join(lines).encode("latin-1"))
+        await writer.drain()
+
+        status_line = (await _read(reader.readline())).decode("latin-1").split(None, 2)
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            raise http.client.BadStatusLine(" ".join(status_line))
+        headers = {}
+        while True:
+            line = (await _read(reader.readline())).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer, int(status_line[1]), headers
+
+async def _body(reader, headers):
+    # Yields the response body, decoding chunked transfer encoding. A body
+    # shorter than its Content-Length raises IncompleteRead (retryable).
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = int((await _read(reader.readline())).split(b";", 1)[0].strip() or b"0", 16)
+            if not size:
+                return
+            yield await _read(reader.readexactly(size))
+            await _read(reader.readline())
+    remaining = int(headers["content-length"]) if "content-length" in headers else None
+    while remaining is None or remaining > 0:
+        chunk = await _read(reader.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)))
+        if not chunk:
+            if remaining:
+                raise http.client.IncompleteRead(b"", remaining)
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+async def _get(url, f, hdrs, cookie=None, sniff=False, limit=None):
+    # Writes the body to the file object `f`, replacing what an earlier
+    # attempt left there.
+    hdrs = list(hdrs) + ([f"Cookie: {cookie}"] if cookie else [])
+    for _ in range(MAX_REDIRECTS + 1):
+        reader, writer, status, headers = await _open(url, hdrs)
+        try:
+            if status in (301, 302, 303, 307, 308) and headers.get("location"):
+                location = urljoin(url, headers["location"])
+                if not v4.same_origin(url, location):
+                    hdrs = v4.strip_credentials(hdrs)
+                url = location
+                continue
+            if status >= 400:
+                raise v4.HttpStatusError(status, url, headers)
+            size = headers.get("content-length")
+            size = int(size) if size and size.isdigit() else None
+            if sniff:
+                reason = v4.sniff_response(headers.get("content-type"), size)
+                if reason:
+                    raise v4.StubResponseError(reason)
+            written = 0
+            f.seek(0)
+            f.truncate()
+            async for chunk in _body(reader, headers):
+                if sniff and not written:
+                    reason = v4.sniff_media_head(chunk)
+                    if reason:
+                        raise v4.StubResponseError(reason)
+                written += len(chunk)
+                if limit and max(written, size or 0) > limit:
+                    raise v4.StubResponseError(
+                        f"response is larger than {v4.format_amount(limit, 'B')}"
+                    )
+                f.write(chunk)
+            return written
+        finally:
+            writer.close()
+    raise v4.DownloadError(f"Too many redirects for {url.split('?', 1)[0]}")
+
+async def _with_retries(url, hdrs, cookie, attempt):
+    # Same retry classification, circuit breaker and backoff as V4's
+    # run_with_retries, with asyncio.sleep between attempts.
+    host, cred = urlsplit(url).netloc.lower(), v4.credential_key(hdrs, cookie, url)
+    job = object()
+    for i in range(v4.RETRY_ATTEMPTS):
+        waited = 0.0
+        while wait := v4.BREAKER.delay(host, cred, waited):
+            await asyncio.sleep(wait)
+            waited += wait
+        try:
+            result = await attempt()
+        except v4.StubResponseError:
+            raise
+        except (*v4.RETRYABLE_ERRORS, EOFError) as e:
+            await asyncio.sleep(v4.retry_wait(e, i, v4.RETRY_ATTEMPTS, host, cred, job))
+        else:
+            v4.BREAKER.success(host)
+            return result
+
+async def fetch(url, dest, hdrs, cookie=None, sniff=False):
+    # Async download_with_headers. Returns the byte count; raises
+    # StubResponseError or DownloadFailed and leaves no file.
+    try:
+        with open(dest, "wb") as f:
+            return await _with_retries(
+                url, hdrs, cookie, lambda: _get(url, f, hdrs, cookie=cookie, sniff=sniff)
+            )
+    except BaseException:
+        v4.remove_temp_files([dest])
+        raise
+
+async def fetch_bytes(url, hdrs, cookie=None, limit=None):
+    # Async V4 fetch_bytes: the body in memory, for small files such as
+    # covers. Raises StubResponseError or DownloadFailed.
+    buf = io.BytesIO()
+    await _with_retries(url, hdrs, cookie,
+                        lambda: _get(url, buf, hdrs, cookie=cookie, limit=limit))
+    return buf.getvalue()
+
+# ——— Pipeline Steps ————————————————————————————————————————————————————
+async def fetch_cover(img_url, hdrs, cookie=None):
+    # Async fetch_cover without the on-disk cache. Returns (data, codec) or
+    # None; nothing touches the disk.
+    try:
+        data = await fetch_bytes(img_url, hdrs, cookie=cookie, limit=v4.COVER_MAX_BYTES)
+    except (v4.StubResponseError, v4.DownloadFailed) as e:
+        v4.print_error(f"Image download failed: {e}")
+        return None
+    codec = v4.cover_codec(data)
+    if codec:
+        return data, codec
+    try:
+        png = await run_tool(_ffmpeg(v4.cover_png_command()), input=data)
+    except subprocess.CalledProcessError as e:
+        v4.print_error(f"Image conversion failed: {e}")
+        return None
+    return (png, "png") if png else None
+
+async def convert(path, cover=None, policy=None):
+    # Async convert_audio (single-pass encode only). Returns (out_path,
+    # cover_embedded); raises CalledProcessError.
+    info = await probe(path)
+    action, out_path = v4.plan_conversion(path, info, policy)
+    if action == "keep":
+        return path, False
+    cmd, out_path = v4.conversion_command(path, info, action, out_path, cover=cover)
+    try:
+        await run_tool(_ffmpeg(cmd), input=cover[0] if cover else None)
+    except BaseException:
+        v4.remove_temp_files([out_path])
+        raise
+    v4.remove_temp_files([path])
+    return out_path, cover is not None
+
+async def embed(path, cover, keep_original=False):
+    # Async embed_cover_art. Returns the new path or None.
+    data, codec = cover
+    out_path = v4.cover_path_for(path)
+    if v4.TAG_WRITER == "mutagen" and path.lower().endswith(".mp3"):
+        return await asyncio.to_thread(
+            v4.embed_cover_in_place, path, out_path, data, codec, keep_original
+        )
+    try:
+        await run_tool(_ffmpeg(v4.cover_remux_command(path, codec, out_path)), input=data)
+    except subprocess.CalledProcessError as e:
+        v4.print_error(f"ffmpeg failed to embed cover art: {e}")
+        v4.remove_temp_files([out_path])
+        return None
+    if not keep_original:
+        v4.remove_temp_files([path])
+    return out_path
+
+# ——— Episodes ——————————————————————————————————————————————————————————
+class _Run:
+    # State shared by the jobs of one call: concurrency limits, covers fetched
+    # once per URL, and where events go.
+    def __init__(self, concurrency=None, cpu_concurrency=None, emit=None):
+        self.net = asyncio.Semaphore(concurrency) if concurrency else None
+        cpu = max(1, cpu_concurrency or v4.CPU_WORKERS)
+        self.cpu = asyncio.Semaphore(cpu)
+        # Downloaded episodes waiting for a conversion slot, as in V4 run_batch.
+        self.pending = asyncio.Semaphore(cpu * 2)
+        self.covers = {}
+        self.emit = emit or (lambda event: None)
+
+    def cover(self, job):
+        key = (job["cover_url"], v4.credential_key(job["headers"], job["cookie"]))
+        if key not in self.covers:
+            self.covers[key] = asyncio.ensure_future(self._fetch_cover(job))
+        return self.covers[key]
+
+    async def _fetch_cover(self, job):
+        # Cover fetches take a download slot like episodes do.
+        if not self.net:
+            return await fetch_cover(job["cover_url"], job["headers"], cookie=job["cookie"])
+        async with self.net:
+            return await fetch_cover(job["cover_url"], job["headers"], cookie=job["cookie"])
+
+    async def close(self):
+        for task in self.covers.values():
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self.covers.values(), return_exceptions=True)
+
+async def _download(job, work, run):
+    # Returns (path, error), like V4 download_episode without --stream.
+    fname = v4.sanitize_filename(os.path.basename(job["url"].split("?", 1)[0]))
+    out_path = os.path.join(work, fname)
+    started = asyncio.get_running_loop().time()
+    try:
+        size = await fetch(job["url"], out_path, job["headers"], cookie=job["cookie"], sniff=True)
+    except (v4.StubResponseError, v4.DownloadFailed) as e:
+        return None, v4.download_failure(e)
+    if size < v4.MIN_EPISODE_BYTES:
+        v4.remove_temp_files([out_path])
+        return None, "File too small; probably an HTML stub."
+    v4.get_meter().add(size, asyncio.get_running_loop().time() - started)
+    try:
+        has_audio = (await probe(out_path))["codec"] is not None
+    except (subprocess.CalledProcessError, OSError):
+        has_audio = False
+    if not has_audio:
+        v4.remove_temp_files([out_path])
+        return None, "Download has no audio stream; probably an HTML error page."
+    return out_path, None
+
+async def _episode(job, out_dir, run, embed_cover, keep_original, policy):
+    # The manifest and staging helpers touch the disk (a manifest hit may copy
+    # a whole episode), so they run in threads to keep the loop free.
+    found = await asyncio.to_thread(v4.find_downloaded, out_dir, job["url"])
+    if found:
+        return _result(job, True, found[0], skipped=True)
+    deadline = job.get("deadline") or v4.link_deadline(job["url"], job["headers"])
+    problem = await asyncio.to_thread(v4.deadline_problem, deadline)
+    if problem:
+        return _result(job, False, error=f"Skipped: {problem}. Paste a fresh cURL and try again.")
+
+    cover_task = run.cover(job) if embed_cover and job.get("cover_url") else None
+    # Everything up to publishing happens in the episode's V4 staging folder.
+    work = await asyncio.to_thread(v4.claim_staging, out_dir, job["url"])
+    try:
+        if run.net:
+            await run.net.acquire()
+        try:
+            run.emit({"event": "started", "job": job})
+            path, err = await _download(job, work, run)
+            if path:
+                await run.pending.acquire()
+        finally:
+            if run.net:
+                run.net.release()
+        if not path:
+            return _result(job, False, error=err)
+
+        try:
+            run.emit({"event": "downloaded", "job": job, "path": path})
+            cover = await cover_task if cover_task else None
+            async with run.cpu:
+                try:
+                    out_path, embedded = await convert(
+                        path, cover=None if keep_original else cover, policy=policy
+                    )
+                except (subprocess.CalledProcessError, OSError):
+                    return _result(job, False, error=f"ffmpeg failed to convert '{path}'.")
+        finally:
+            run.pending.release()
+        run.emit({"event": "converted", "job": job, "path": out_path})
+
+        related = []
+        if cover and not embedded:
+            new_path = await embed(out_path, cover, keep_original=keep_original)
+            if not new_path:
+                out_path = await asyncio.to_thread(v4.publish, out_path, out_dir)
+                return _result(job, False, out_path, "Embedding cover failed.")
+            if keep_original:
+                related.append(await asyncio.to_thread(v4.publish, out_path, out_dir))
+            out_path = new_path
+        out_path = await asyncio.to_thread(v4.publish, out_path, out_dir)
+    finally:
+        await asyncio.to_thread(v4.release_staging, work)
+    await asyncio.to_thread(v4.record_download, job["url"], out_path, related)
+    if cover_task and not cover:
+        return _result(job, False, out_path, "Cover download failed.")
+    return _result(job, True, out_path)
+
+async def _finish(job, out_dir, run, embed_cover, keep_original, policy):
+    try:
+        res = await _episode(job, out_dir, run, embed_cover, keep_original, policy)
+    except Exception as e:
+        res = _result(job, False, error=str(e))
+    if res["ok"]:
+        v4.print_success(f"{res['name']} -> {res['path']}")
+    else:
+        v4.print_error(f"{res['name']}: {res['error']}")
+    run.emit({"event": "finished", "job": job, "result": res})
+    return res
+
+async def download_episode(job, out_dir=".", *, embed_cover=True, keep_original=False,
+                           policy=None):
+    # Downloads, converts and tags one episode. `job` is a pasted cURL or a
+    # --jobs style dict. Returns the result dict ("name", "ok", "path",
+    # "error", and "skipped" for manifest hits); failures are reported there
+    # rather than raised.
+    job = as_job(job)
+    os.makedirs(out_dir, exist_ok=True)
+    run = _Run()
+    try:
+        return await _finish(job, out_dir, run, embed_cover, keep_original, policy)
+    finally:
+        await run.close()
+
+async def run_batch(jobs, out_dir=".", *, concurrency=16, cpu_concurrency=None,
+                    embed_cover=True, keep_original=False, policy=None):
+    # Async generator of event dicts: "started", "downloaded" and "converted"
+    # (with the "path" in the staging folder) and "finished" (with "result")
+    # for every job, each carrying its normalized "job". At most `concurrency` downloads and
+    # `cpu_concurrency` ffmpeg conversions run at once. Jobs run in
+    # earliest-link-expiry order; repeated URLs finish at once as skipped.
+    # Leaving the loop early cancels the remaining jobs.
+    os.makedirs(out_dir, exist_ok=True)
+    events = asyncio.Queue()
+    run = _Run(max(1, concurrency), cpu_concurrency, emit=events.put_nowait)
+    seen, unique = set(), []
+    for job in map(as_job, jobs):
+        if v4.url_key(job["url"]) not in seen:
+            seen.add(v4.url_key(job["url"]))
+            unique.append(job)
+            continue
+        yield {"event": "finished", "job": job,
+               "result": _result(job, True, skipped=True)}
+    unique = v4.schedule_jobs(unique, concurrency)
+    tasks = [asyncio.ensure_future(_finish(job, out_dir, run, embed_cover, keep_original, policy))
+             for job in unique]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event = await events.get()
+            remaining -= event["event"] == "finished"
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await run.close()
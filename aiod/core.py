@@ -0,0 +1,26 @@
+# Loads "AIO Dowloader V4 (YGVQ).py" as a module, so the package reuses the
+# script's cURL parsing, retry policy, probe and conversion steps instead of
+# keeping a second copy of them. Importing the script has no side effects:
+# colorama and the ffmpeg/ffprobe checks only run under __main__.
+import importlib.util
+import os
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "AIO Dowloader V4 (YGVQ).py")
+
+def load_v4():
+    name = "aiod._v4"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+v4 = load_v4()
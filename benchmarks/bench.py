@@ -0,0 +1,196 @@
+# End-to-end benchmark of the V4 pipeline (download -> convert -> cover
+# embed, through V4's run_batch) against the local stand-in CDN in cdn.py.
+# Each concurrency level downloads a fresh set of synthetic episodes into a
+# temp folder with the manifest off and a clean cache, and reports
+# episodes/min, MB/s and V4's per-stage timings. Results go to a JSON file;
+# pass an earlier one as --baseline to flag regressions.
+#
+#   python benchmarks/bench.py --episodes 8 --concurrency 1,4,8 --minutes 5 \
+#       --latency 50 --rate 10 --out results.json --baseline old.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cdn import add_cdn_arguments, config_from_args, start_cdn
+
+RESULTS_VERSION = 1
+
+def load_pipeline(args):
+    from aiod.core import v4
+    v4.LOG_HOOK = (lambda level, msg: print(msg.strip(), file=sys.stderr)) if args.verbose else \
+        (lambda level, msg: print(msg.strip(), file=sys.stderr) if level == "error" else None)
+    v4.MANIFEST_ENABLED = False
+    v4.DEDUPE_LINKS = "off"
+    v4.OUTPUT_POLICY = args.output
+    v4.DOWNLOAD_SEGMENTS = max(1, args.segments)
+    v4.STREAM_TRANSCODE = args.stream
+    v4.PARALLEL_ENCODE = max(0, args.parallel_encode)
+    return v4
+
+def reset_pipeline(v4, args, cache):
+    # Fresh connections, circuit breaker and caches for every run.
+    os.environ["AIOD_CACHE_DIR"] = cache
+    v4._cover_cache = None
+    v4._meter = None
+    v4.BREAKER = v4.CircuitBreaker()
+    v4.set_transport(v4.make_transport(args.transport))
+    v4.METRICS = v4.Metrics()
+
+def make_jobs(base, run_id, episodes, formats, cover):
+    return [{
+        "url": f"{base}/ep{run_id * 10000 + n}.{formats[n % len(formats)]}?sig=bench",
+        "headers": ["Range: bytes=0-"],
+        "cookie": None,
+        "cover_url": f"{base}/cover.jpg" if cover else None,
+    } for n in range(episodes)]
+
+def run_once(v4, args, base, cdn, run_id, workers):
+    work = tempfile.mkdtemp(prefix="aiod-bench-")
+    out_dir, cache = os.path.join(work, "out"), os.path.join(work, "cache")
+    os.makedirs(out_dir)
+    reset_pipeline(v4, args, cache)
+    jobs = make_jobs(base, run_id, args.episodes, args.formats.split(","), not args.no_cover)
+    before = dict(cdn.stats)
+    started = time.perf_counter()
+    try:
+        results = v4.run_batch(out_dir, jobs, "n" if args.no_cover else "y",
+                               workers=workers, cpu_workers=args.cpu_workers)
+        wall = time.perf_counter() - started
+        stages = v4.METRICS.summary()
+    finally:
+        v4.METRICS = None
+        v4.TRANSPORT.close()
+        shutil.rmtree(work, ignore_errors=True)
+    ok = sum(1 for r in results if r["ok"])
+    received = sum(stages.get(name, {}).get("bytes", 0) for name in ("download", "stream"))
+    return {
+        "workers": workers,
+        "cpu_workers": args.cpu_workers or v4.CPU_WORKERS,
+        "episodes": len(results),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "errors": sorted({r["error"] for r in results if not r["ok"]}),
+        "wall_s": round(wall, 3),
+        "episodes_per_min": round(ok / wall * 60, 3) if wall else 0.0,
+        "mb_per_s": round(received / wall / 1e6, 3) if wall else 0.0,
+        "stages": {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()}
+                   for name, row in stages.items()},
+        "cdn": {k: cdn.stats[k] - before[k] for k in cdn.stats},
+    }
+
+def ffmpeg_version():
+    try:
+        out = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode(errors="replace").splitlines()[0]
+
+def print_run(run):
+    print(f"workers={run['workers']:<3} {run['ok']}/{run['episodes']} ok  "
+          f"{run['wall_s']:8.2f}s  {run['episodes_per_min']:7.2f} episodes/min  "
+          f"{run['mb_per_s']:7.2f} MB/s")
+    for name, row in run["stages"].items():
+        print(f"    {name:<9}{row['count']:>4}x  p50 {row['p50']:7.2f}s  p95 {row['p95']:7.2f}s  "
+              f"cpu {row['cpu']:8.2f}s")
+    for error in run["errors"]:
+        print(f"    error: {error}")
+
+def compare(runs, baseline_path, tolerance):
+    # Prints the change in episodes/min per concurrency level; returns False
+    # when any level got slower than `tolerance` percent.
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["workers"]: r for r in json.load(f)["runs"]}
+    ok = True
+    print(f"\nAgainst {baseline_path}:")
+    for run in runs:
+        old = baseline.get(run["workers"])
+        if not old or not old["episodes_per_min"]:
+            print(f"workers={run['workers']:<3} no baseline")
+            continue
+        change = (run["episodes_per_min"] / old["episodes_per_min"] - 1) * 100
+        slower = change < -tolerance
+        ok = ok and not slower
+        print(f"workers={run['workers']:<3} {old['episodes_per_min']:7.2f} -> "
+              f"{run['episodes_per_min']:7.2f} episodes/min ({change:+.1f}%)"
+              f"{'  REGRESSION' if slower else ''}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the V4 pipeline against a local CDN")
+    parser.add_argument("--episodes", type=int, default=8,
+                        help="episodes per concurrency level (default: 8)")
+    parser.add_argument("--concurrency", default="1,2,4,8",
+                        help="comma-separated download worker counts to run (default: 1,2,4,8)")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help="conversion workers (default: one per core)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per level; the median by episodes/min is kept")
+    parser.add_argument("--formats", default="m4a,mp3",
+                        help="episode formats, used in turn (default: m4a,mp3)")
+    parser.add_argument("--no-cover", action="store_true", help="don't embed covers")
+    parser.add_argument("--transport", choices=("http", "curl"), default="http")
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--parallel-encode", type=int, default=0)
+    parser.add_argument("--output", choices=("mp3", "native"), default="mp3")
+    add_cdn_arguments(parser)
+    parser.add_argument("--out", default="bench_results.json", help="results file")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="allowed episodes/min drop against the baseline in percent (default: 10)")
+    parser.add_argument("--verbose", action="store_true", help="show the downloader's messages")
+    args = parser.parse_args()
+
+    for tool in ("ffmpeg", "ffprobe") + (("curl",) if args.transport == "curl" else ()):
+        if not shutil.which(tool):
+            parser.error(f"{tool} is not on PATH")
+    levels = [int(n) for n in args.concurrency.split(",") if n.strip()]
+
+    print(f"Generating {args.minutes:g}-minute test episodes...")
+    config = config_from_args(args)
+    server, base = start_cdn(config)
+    v4 = load_pipeline(args)
+
+    runs = []
+    try:
+        for level in levels:
+            attempts = [run_once(v4, args, base, config, len(runs) * args.repeat + i, level)
+                        for i in range(max(1, args.repeat))]
+            attempts.sort(key=lambda r: r["episodes_per_min"])
+            runs.append(attempts[len(attempts) // 2])
+            print_run(runs[-1])
+    finally:
+        server.shutdown()
+
+    sizes = {ext.lstrip("."): os.path.getsize(path) for ext, path in config.files.items()}
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "ffmpeg": ffmpeg_version(),
+        },
+        "settings": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "verbose")},
+        "file_sizes": sizes,
+        "runs": runs,
+        "best_episodes_per_min": max((r["episodes_per_min"] for r in runs), default=0.0),
+        "median_episodes_per_min": statistics.median([r["episodes_per_min"] for r in runs]) if runs else 0.0,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+    if args.baseline and not compare(runs, args.baseline, args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,225 @@
+# Stand-in CDN for benchmarking the downloader: serves synthetic episodes
+# generated with ffmpeg's lavfi sources, with configurable latency,
+# per-connection bandwidth cap, Range support and injected failures.
+#
+#   python benchmarks/cdn.py --port 8000 --minutes 25 --latency 80 --rate 5
+#
+# serves /ep<N>.m4a, /ep<N>.mp3 (any N) and /cover.jpg until Ctrl+C.
+# /go/<path> redirects to /<path>, or to <to>/<path> with ?to=<base url>.
+import argparse
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+CONTENT_TYPES = {".m4a": "audio/mp4", ".mp3": "audio/mpeg", ".jpg": "image/jpeg"}
+
+# ——— Synthetic Media ———————————————————————————————————————————————————
+def media_dir():
+    path = os.path.join(tempfile.gettempdir(), "aiod-bench-media")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def generate_media(minutes, out_dir=None):
+    # Speech-like stereo audio (a sine with pink noise under it) at the
+    # bitrates podcasts ship: 128k AAC in M4A (faststart) and 128k MP3, plus
+    # a 1400x1400 JPEG cover. Files are cached per length. Returns
+    # {".m4a": path, ".mp3": path, ".jpg": path}.
+    out_dir = out_dir or media_dir()
+    secs = max(1, int(minutes * 60))
+    source = (f"sine=frequency=220:sample_rate=44100:duration={secs},"
+              f"aformat=channel_layouts=stereo[a];"
+              f"anoisesrc=color=pink:amplitude=0.05:sample_rate=44100:duration={secs},"
+              f"aformat=channel_layouts=stereo[n];[a][n]amix=inputs=2")
+    targets = {
+        ".m4a": ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+        ".mp3": ["-c:a", "libmp3lame", "-b:a", "128k"],
+    }
+    paths = {}
+    for ext, codec in targets.items():
+        path = os.path.join(out_dir, f"episode_{secs}s{ext}")
+        if not os.path.exists(path):
+            tmp = path + ".tmp" + ext
+            subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                            "-f", "lavfi", "-i", source, *codec, tmp], check=True)
+            os.replace(tmp, path)
+        paths[ext] = path
+    cover = os.path.join(out_dir, "cover.jpg")
+    if not os.path.exists(cover):
+        subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                        "-f", "lavfi", "-i", "testsrc2=size=1400x1400", "-frames:v", "1",
+                        "-q:v", "3", cover + ".tmp.jpg"], check=True)
+        os.replace(cover + ".tmp.jpg", cover)
+    paths[".jpg"] = cover
+    return paths
+
+# ——— Server ————————————————————————————————————————————————————————————
+class CDNConfig:
+    def __init__(self, files, latency_ms=0, rate_mbps=0, ranges=True,
+                 fail_rate=0.0, drop_rate=0.0, seed=0):
+        self.files = files                # extension -> path
+        self.latency = latency_ms / 1000.0
+        self.rate = rate_mbps * 1e6       # bytes/s per connection, 0 = unlimited
+        self.ranges = ranges
+        self.fail_rate = fail_rate        # share of requests answered 503
+        self.drop_rate = drop_rate        # share of bodies cut off halfway
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "with_credentials": 0,
+                      "bytes": 0, "failed": 0, "dropped": 0}
+
+    def roll(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+class CDNHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+    chunk_size = 64 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        self.config.count("connections")
+        super().setup()
+
+    def do_HEAD(self):
+        self.serve(body=False)
+
+    def do_GET(self):
+        self.serve(body=True)
+
+    def serve(self, body):
+        cfg = self.config
+        cfg.count("requests")
+        if self.headers.get("Cookie") or self.headers.get("Authorization"):
+            cfg.count("with_credentials")
+        if cfg.latency:
+            time.sleep(cfg.latency)
+        path, _, query = self.path.partition("?")
+        if path.startswith("/go/"):
+            to = parse_qs(query).get("to", [""])[0]
+            return self.send_empty(302, [("Location", to + path[3:])])
+        m = re.fullmatch(r"/(?:ep\d+|cover)(\.m4a|\.mp3|\.jpg)", path)
+        if not m or m.group(1) not in cfg.files:
+            return self.send_empty(404)
+        if cfg.roll(cfg.fail_rate):
+            cfg.count("failed")
+            return self.send_empty(503, [("Retry-After", "0")])
+
+        file_path = cfg.files[m.group(1)]
+        size = os.path.getsize(file_path)
+        start, end, status = 0, size - 1, 200
+        rng = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if rng and cfg.ranges:
+            start = int(rng.group(1))
+            end = min(int(rng.group(2)) if rng.group(2) else size - 1, size - 1)
+            if start >= size:
+                return self.send_empty(416, [("Content-Range", f"bytes */{size}")])
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES[m.group(1)])
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"{int(os.path.getmtime(file_path))}-{size}"')
+        if cfg.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if body:
+            self.send_body(file_path, start, end - start + 1)
+
+    def send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_body(self, file_path, start, length):
+        cfg = self.config
+        cut = length // 2 if length > self.chunk_size and cfg.roll(cfg.drop_rate) else None
+        sent, began = 0, time.monotonic()
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            while sent < length:
+                if cut is not None and sent >= cut:
+                    cfg.count("dropped")
+                    self.close_connection = True
+                    return
+                chunk = f.read(min(self.chunk_size, length - sent))
+                if not chunk:
+                    return
+                try:
+                    self.wfile.write(chunk)
+                except OSError:
+                    return
+                sent += len(chunk)
+                cfg.count("bytes", len(chunk))
+                if cfg.rate:
+                    # Sleep off whatever got ahead of the per-connection cap.
+                    ahead = sent / cfg.rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+def start_cdn(config, port=0, ssl_context=None):
+    # Returns (server, base_url); the server runs in a daemon thread. With
+    # `ssl_context` (a server-side SSLContext) it speaks HTTPS.
+    handler = type("Handler", (CDNHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    if ssl_context:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheme = "https" if ssl_context else "http"
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+def add_cdn_arguments(parser):
+    parser.add_argument("--minutes", type=float, default=25,
+                        help="length of the synthetic episodes (default: 25)")
+    parser.add_argument("--latency", type=float, default=0, metavar="MS",
+                        help="delay before every response in milliseconds")
+    parser.add_argument("--rate", type=float, default=0, metavar="MBPS",
+                        help="bandwidth cap per connection in MB/s (default: unlimited)")
+    parser.add_argument("--no-ranges", action="store_true",
+                        help="ignore Range requests and always send the whole file")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of requests answered with 503 (0-1)")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="share of bodies cut off halfway (0-1)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for injected failures")
+
+def config_from_args(args):
+    return CDNConfig(generate_media(args.minutes), latency_ms=args.latency, rate_mbps=args.rate,
+                     ranges=not args.no_ranges, fail_rate=args.fail_rate,
+                     drop_rate=args.drop_rate, seed=args.seed)
+
+if __name__ == "__main__":
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg is required to generate the test episodes.", file=sys.stderr)
+        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Local stand-in CDN with synthetic episodes")
+    parser.add_argument("--port", type=int, default=8000)
+    add_cdn_arguments(parser)
+    args = parser.parse_args()
+    server, base = start_cdn(config_from_args(args), args.port)
+    print(f"Serving {base}/ep1.m4a, {base}/ep1.mp3 and {base}/cover.jpg (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,141 @@
+# Checks V4's pure-Python HttpTransport against the stand-in CDN in cdn.py,
+# over plain HTTP and over HTTPS with a throwaway self-signed certificate
+# (made with openssl): connection pooling, redirects (credentials must not
+# follow one to another host) and byte ranges, including a segmented
+# download. Also checks url_key, which keys resume state, staging and the
+# manifest. Prints one line per check; the exit code is 1 if any failed.
+#
+#   python benchmarks/transport_check.py
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cdn import CDNConfig, start_cdn
+
+def make_files(work):
+    # Random bytes stand in for media: the transport never looks inside.
+    files = {}
+    for ext, size in ((".m4a", 5 * 1024 * 1024 + 123), (".jpg", 200 * 1024)):
+        path = os.path.join(work, "file" + ext)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        files[ext] = path
+    return files
+
+def make_certificate(work):
+    # Returns (server_context, client_context) for a self-signed 127.0.0.1.
+    cert, key = os.path.join(work, "cert.pem"), os.path.join(work, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                    "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1"],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    server = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server.load_cert_chain(cert, key)
+    return server, ssl.create_default_context(cafile=cert)
+
+# (name, url a, url b, same key expected)
+URL_KEY_CASES = [
+    ("fresh CloudFront signature", "https://cdn.example/ep1.m4a?Expires=1&Signature=a&Key-Pair-Id=k",
+     "https://cdn.example/ep1.m4a?Expires=2&Signature=b&Key-Pair-Id=k", True),
+    ("fresh S3 signature", "https://s3.example/ep1.m4a?X-Amz-Date=1&X-Amz-Signature=a",
+     "https://s3.example/ep1.m4a?X-Amz-Date=2&X-Amz-Signature=b", True),
+    ("different id", "https://host.example/download?id=1&token=a",
+     "https://host.example/download?id=2&token=a", False),
+    ("parameter order", "https://host.example/download?id=1&fmt=m4a",
+     "https://host.example/download?fmt=m4a&id=1&token=b", True),
+    ("host case", "https://Host.Example/ep1.m4a", "https://host.example/ep1.m4a", True),
+]
+
+def url_key_checks(v4):
+    for name, a, b, same in URL_KEY_CASES:
+        ka, kb = v4.url_key(a), v4.url_key(b)
+        yield f"url_key: {name}", (ka == kb) == same, kb if same else f"{ka} / {kb}"
+
+def run_checks(v4, files, work, server_context=None, client_context=None):
+    # Yields (name, ok, detail) for one scheme.
+    config, other = CDNConfig(files), CDNConfig(files)
+    servers = [start_cdn(config, ssl_context=server_context),
+               start_cdn(other, ssl_context=server_context)]
+    (_, base), (_, other_base) = servers
+    transport = v4.HttpTransport(ssl_context=client_context)
+    with open(files[".jpg"], "rb") as f:
+        cover = f.read()
+    with open(files[".m4a"], "rb") as f:
+        episode = f.read()
+    try:
+        before = config.stats["connections"]
+        bodies = [transport.read(f"{base}/cover.jpg", []) for _ in range(3)]
+        opened = config.stats["connections"] - before
+        yield "pooling", opened == 1 and all(b == cover for b in bodies), \
+            f"3 requests over {opened} connection(s)"
+
+        body = transport.read(f"{base}/go/cover.jpg", [])
+        yield "redirect", body == cover, "relative Location followed"
+
+        secrets = ["Authorization: Bearer SECRET"]
+        before = (config.stats["with_credentials"], other.stats["with_credentials"])
+        body = transport.read(f"{base}/go/cover.jpg?to={other_base}", secrets, cookie="sid=SECRET")
+        sent = (config.stats["with_credentials"] - before[0], other.stats["with_credentials"] - before[1])
+        yield "redirect to another host", body == cover and sent == (1, 0), \
+            f"credentials sent to origin {sent[0]}x, to redirect target {sent[1]}x"
+
+        dest = os.path.join(work, "ep2.m4a")
+        before = (other.stats["requests"], other.stats["with_credentials"])
+        transport.download(f"{base}/go/ep2.m4a?to={other_base}", dest, secrets, cookie="sid=SECRET",
+                           segments=4, min_segment_size=1024 * 1024)
+        with open(dest, "rb") as f:
+            same = f.read() == episode
+        requests = other.stats["requests"] - before[0]
+        leaked = other.stats["with_credentials"] - before[1]
+        yield "segments on another host", same and requests > 1 and not leaked, \
+            f"{requests} requests to redirect target, {leaked} with credentials"
+        os.remove(dest)
+
+        _, total, _, _ = transport.probe(f"{base}/ep1.m4a", [])
+        yield "range probe", total == len(episode), f"size {total}"
+
+        dest = os.path.join(work, "ep1.m4a")
+        before = config.stats["requests"]
+        transport.download(f"{base}/go/ep1.m4a", dest, [], segments=4, resume=True,
+                           min_segment_size=1024 * 1024)
+        with open(dest, "rb") as f:
+            same = f.read() == episode
+        requests = config.stats["requests"] - before
+        leftovers = [n for n in os.listdir(work) if n.startswith("ep1.m4a.")]
+        yield "segmented download", same and not leftovers, \
+            f"{requests} requests, {'identical' if same else 'corrupt'} file"
+        os.remove(dest)
+    finally:
+        transport.close()
+        for server, _ in servers:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    from aiod.core import v4
+    v4.LOG_HOOK = lambda level, msg: None
+    work = tempfile.mkdtemp(prefix="aiod-transport-")
+    failed = 0
+    for name, ok, detail in url_key_checks(v4):
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'}  {'-':<5} {name:<34} {detail}")
+    try:
+        files = make_files(work)
+        schemes = [("http", None, None)]
+        if shutil.which("openssl"):
+            schemes.append(("https", *make_certificate(work)))
+        else:
+            print("openssl is not on PATH; skipping the HTTPS checks")
+        for scheme, server_context, client_context in schemes:
+            for name, ok, detail in run_checks(v4, files, work, server_context, client_context):
+                failed += not ok
+                print(f"{'ok  ' if ok else 'FAIL'}  {scheme:<5} {name:<34} {detail}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    sys.exit(1 if failed else 0)